@@ -5,15 +5,49 @@ Advanced user context tracking and proactive assistance
 """
 
 import os
-import json
 import sqlite3
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, field
 from enum import Enum
 import numpy as np
+import orjson
 from collections import defaultdict, deque
 import logging
+import time
+import atexit
+from operator import attrgetter
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pa_dataset
+    import pyarrow.parquet as pq
+except ImportError:  # Columnar analytics store is optional
+    pa = None
+
+def _dumps(obj: Any) -> str:
+    """Serialize to a JSON string with orjson"""
+    return orjson.dumps(obj).decode()
+
+_loads = orjson.loads
+
+def _json_or(value: Optional[str], default: Any) -> Any:
+    """Decode a stored JSON column, falling back to default for NULL/empty values"""
+    return _loads(value) if value else default
+
+_by_timestamp = attrgetter('timestamp')
+
+def _decode_time_patterns(value: Any) -> np.ndarray:
+    """Decode a stored hour-of-day histogram into a writable int32 array of length 24"""
+    
+    hour_freq = np.zeros(24, dtype=np.int32)
+    if isinstance(value, bytes):
+        hour_freq[:] = np.frombuffer(value, dtype=np.int32)
+    elif value:
+        # Legacy rows stored the histogram as a JSON object keyed by hour string
+        for hour, count in _loads(value).items():
+            hour_freq[int(hour)] = count
+    return hour_freq
 
 class ContextType(Enum):
     UI_STATE = "ui_state"
@@ -33,7 +67,27 @@ class ActivityType(Enum):
     NAVIGATION = "navigation"
     IDLE = "idle"
 
-@dataclass
+# Intent rules in precedence order:
+# (trigger activity types, intent, confidence, evidence, required context, recommended actions)
+_INTENT_RULES = (
+    (
+        frozenset({ActivityType.DOCUMENT_VIEW}),
+        'document_editing', 0.8, 'User viewing documents', 'document',
+        ('Provide relevant templates', 'Suggest legal precedents', 'Offer document formatting assistance')
+    ),
+    (
+        frozenset({ActivityType.SEARCH_PERFORMED, ActivityType.QUERY_SUBMITTED}),
+        'legal_research', 0.9, 'User performing searches', None,
+        ('Provide comprehensive legal analysis', 'Suggest related case law', 'Offer jurisdiction-specific guidance')
+    ),
+    (
+        frozenset({ActivityType.CASE_OPENED}),
+        'case_management', 0.85, 'User accessing case information', 'case',
+        ('Provide case timeline overview', 'Suggest next legal steps', 'Offer deadline reminders')
+    )
+)
+
+@dataclass(slots=True)
 class UIState:
     """Represents current UI state and user interface context"""
     current_page: str
@@ -43,8 +97,19 @@ class UIState:
     form_data: Dict[str, Any]
     selected_text: Optional[str] = None
     mouse_position: Optional[Tuple[int, int]] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'current_page': self.current_page,
+            'active_tabs': self.active_tabs,
+            'focused_element': self.focused_element,
+            'scroll_position': self.scroll_position,
+            'form_data': self.form_data,
+            'selected_text': self.selected_text,
+            'mouse_position': self.mouse_position
+        }
 
-@dataclass
+@dataclass(slots=True)
 class UserActivity:
     """Represents user activity and behavior patterns"""
     activity_type: ActivityType
@@ -53,8 +118,18 @@ class UserActivity:
     context_data: Dict[str, Any]
     user_intent: Optional[str] = None
     confidence_score: float = 0.0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'activity_type': self.activity_type.value,
+            'timestamp': self.timestamp.isoformat(),
+            'duration': self.duration,
+            'context_data': self.context_data,
+            'user_intent': self.user_intent,
+            'confidence_score': self.confidence_score
+        }
 
-@dataclass
+@dataclass(slots=True)
 class DocumentState:
     """Represents current document state and editing context"""
     document_id: str
@@ -64,8 +139,19 @@ class DocumentState:
     recent_changes: List[Dict[str, Any]]
     collaborators: List[str]
     version: str
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'document_id': self.document_id,
+            'document_type': self.document_type,
+            'current_section': self.current_section,
+            'cursor_position': self.cursor_position,
+            'recent_changes': self.recent_changes,
+            'collaborators': self.collaborators,
+            'version': self.version
+        }
 
-@dataclass
+@dataclass(slots=True)
 class CaseContext:
     """Represents current case context and legal matter information"""
     case_id: str
@@ -77,8 +163,32 @@ class CaseContext:
     current_phase: str
     assigned_attorney: str
     case_status: str
+    # Parallel name/timestamp arrays over the datetime-valued key dates
+    key_date_names: List[str] = field(init=False, repr=False)
+    key_date_timestamps: np.ndarray = field(init=False, repr=False)
+    
+    def __post_init__(self):
+        dated = [(name, value) for name, value in self.key_dates.items() if isinstance(value, datetime)]
+        self.key_date_names = [name for name, _ in dated]
+        self.key_date_timestamps = np.array([value for _, value in dated], dtype='datetime64[us]')
+        
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'case_id': self.case_id,
+            'case_title': self.case_title,
+            'case_type': self.case_type,
+            'jurisdiction': self.jurisdiction,
+            'parties': self.parties,
+            'key_dates': {
+                name: value.isoformat() if isinstance(value, datetime) else value
+                for name, value in self.key_dates.items()
+            },
+            'current_phase': self.current_phase,
+            'assigned_attorney': self.assigned_attorney,
+            'case_status': self.case_status
+        }
 
-@dataclass
+@dataclass(slots=True)
 class SessionMemory:
     """Represents session memory and conversation context"""
     session_id: str
@@ -87,8 +197,18 @@ class SessionMemory:
     current_topics: List[str]
     unresolved_queries: List[str]
     context_switches: List[datetime]
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'session_id': self.session_id,
+            'conversation_history': self.conversation_history,
+            'user_preferences': self.user_preferences,
+            'current_topics': self.current_topics,
+            'unresolved_queries': self.unresolved_queries,
+            'context_switches': [switch.isoformat() for switch in self.context_switches]
+        }
 
-@dataclass
+@dataclass(slots=True)
 class HistoricalData:
     """Represents historical user data and patterns"""
     user_id: str
@@ -97,10 +217,22 @@ class HistoricalData:
     preferred_features: List[str]
     common_queries: List[Tuple[str, int]]
     document_types_used: Dict[str, int]
-    time_patterns: Dict[str, int]  # hour of day -> frequency
+    time_patterns: np.ndarray  # shape (24,), int32 - frequency per hour of day
     productivity_metrics: Dict[str, float]
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'user_id': self.user_id,
+            'total_sessions': self.total_sessions,
+            'average_session_duration': self.average_session_duration,
+            'preferred_features': self.preferred_features,
+            'common_queries': self.common_queries,
+            'document_types_used': self.document_types_used,
+            'time_patterns': self.time_patterns.tolist(),
+            'productivity_metrics': self.productivity_metrics
+        }
 
-@dataclass
+@dataclass(slots=True)
 class EnvironmentalContext:
     """Represents environmental and system context"""
     time_of_day: str
@@ -110,8 +242,19 @@ class EnvironmentalContext:
     device_type: str
     browser_info: Dict[str, str]
     location_context: Optional[str] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'time_of_day': self.time_of_day,
+            'day_of_week': self.day_of_week,
+            'system_performance': self.system_performance,
+            'network_status': self.network_status,
+            'device_type': self.device_type,
+            'browser_info': self.browser_info,
+            'location_context': self.location_context
+        }
 
-@dataclass
+@dataclass(slots=True)
 class ComprehensiveContext:
     """Comprehensive user context combining all sources"""
     user_id: str
@@ -133,15 +276,81 @@ class LawMatrixContextualAwarenessSystem:
     Provides comprehensive user understanding and proactive assistance
     """
     
+    # Database paths whose schema has already been created in this process
+    _schema_initialized = set()
+    
+    # Hot-path statements, kept constant so the connection's statement cache reuses them
+    _CTX_INSERT_SQL = '''
+        INSERT INTO comprehensive_context 
+        (user_id, session_id, timestamp, ui_state, user_activity, document_state,
+         case_context, session_memory, historical_data, environmental_context,
+         context_confidence, derived_insights, hour_of_day, device_type,
+         network_status, primary_intent)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    
+    _ASSIST_INSERT_SQL = '''
+        INSERT INTO proactive_assistance 
+        (user_id, session_id, assistance_type, trigger_context, suggested_action,
+         user_response, effectiveness_score)
+        VALUES (?, ?, ?, ?, ?, NULL, NULL)
+    '''
+    
+    _PATTERN_SELECT_SQL = "SELECT * FROM user_patterns WHERE user_id = ?"
+    
+    # Counters are advanced in SQL; the row is updated in place rather than deleted and re-inserted
+    _PATTERN_UPSERT_SQL = '''
+        INSERT INTO user_patterns 
+        (user_id, total_sessions, average_session_duration, preferred_features,
+         common_queries, document_types_used, time_patterns, productivity_metrics,
+         most_used_doc_type)
+        VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            total_sessions = total_sessions + 1,
+            average_session_duration = (average_session_duration + excluded.average_session_duration) / 2,
+            preferred_features = excluded.preferred_features,
+            common_queries = excluded.common_queries,
+            document_types_used = excluded.document_types_used,
+            time_patterns = excluded.time_patterns,
+            productivity_metrics = excluded.productivity_metrics,
+            most_used_doc_type = excluded.most_used_doc_type,
+            last_updated = CURRENT_TIMESTAMP
+    '''
+    
     def __init__(self, db_path: str = "lawmatrix_context.db"):
         self.db_path = db_path
         self.logger = self._setup_logging()
+        
+        # Single long-lived connection; transactions are managed explicitly
+        self._conn = sqlite3.connect(
+            self.db_path, isolation_level=None, check_same_thread=False, cached_statements=256
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        self._conn.row_factory = sqlite3.Row
+        self._cur = self._conn.cursor()
         self._initialize_database()
         
+        # Columnar copy of the scalar context fields for analytics - one Parquet file per
+        # writer, a row group per flush; the writer is finalized before reads and on close
+        self.columns_path = os.path.splitext(self.db_path)[0] + "_context_columns"
+        self._columns_writer = None
+        
+        # Write buffering - contexts are flushed in a single transaction
+        self._pending_ctx = []
+        self._pending_columns = []
+        self._pending_assist = []
+        self.flush_batch_size = 500
+        self.flush_interval = 5.0  # seconds
+        self._last_flush = time.monotonic()
+        atexit.register(self._close_columns_writer)  # atexit is LIFO, so this runs after the flush
+        atexit.register(self.flush)
+        
         # Context tracking
         self.active_sessions = {}
         self.user_patterns = defaultdict(list)
-        self.context_history = deque(maxlen=1000)
+        self.context_history = deque(maxlen=1000)  # (timestamp, user_id, session_id, primary_intent)
         
         # Proactive assistance thresholds
         self.assistance_thresholds = {
@@ -167,11 +376,12 @@ class LawMatrixContextualAwarenessSystem:
     def _initialize_database(self):
         """Initialize database for contextual data storage"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create comprehensive context table
-        cursor.execute('''
+        # Schema only needs creating once per database file per process
+        if self.db_path in self._schema_initialized:
+            return
+            
+        self._conn.executescript('''
+            -- Create comprehensive context table
             CREATE TABLE IF NOT EXISTS comprehensive_context (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id TEXT NOT NULL,
@@ -186,12 +396,14 @@ class LawMatrixContextualAwarenessSystem:
                 environmental_context TEXT NOT NULL,
                 context_confidence REAL NOT NULL,
                 derived_insights TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create user patterns table
-        cursor.execute('''
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                hour_of_day INTEGER,
+                device_type TEXT,
+                network_status TEXT,
+                primary_intent TEXT
+            );
+            
+            -- Create user patterns table
             CREATE TABLE IF NOT EXISTS user_patterns (
                 user_id TEXT PRIMARY KEY,
                 total_sessions INTEGER NOT NULL,
@@ -199,14 +411,13 @@ class LawMatrixContextualAwarenessSystem:
                 preferred_features TEXT,
                 common_queries TEXT,
                 document_types_used TEXT,
-                time_patterns TEXT,
+                time_patterns BLOB,
                 productivity_metrics TEXT,
-                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create proactive assistance table
-        cursor.execute('''
+                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                most_used_doc_type TEXT
+            );
+            
+            -- Create proactive assistance table
             CREATE TABLE IF NOT EXISTS proactive_assistance (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id TEXT NOT NULL,
@@ -217,52 +428,215 @@ class LawMatrixContextualAwarenessSystem:
                 user_response TEXT,
                 effectiveness_score REAL,
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+            );
+            
+            -- Create indexes for per-user lookups (user_patterns is keyed by its primary key)
+            CREATE INDEX IF NOT EXISTS idx_ctx_user_session_ts
+            ON comprehensive_context(user_id, session_id, timestamp DESC);
+            
+            CREATE INDEX IF NOT EXISTS idx_assist_user_ts
+            ON proactive_assistance(user_id, timestamp DESC);
         ''')
         
-        conn.commit()
-        conn.close()
+        # Bring tables created by earlier versions up to the current column set
+        self._ensure_columns('comprehensive_context', {
+            'hour_of_day': 'INTEGER',
+            'device_type': 'TEXT',
+            'network_status': 'TEXT',
+            'primary_intent': 'TEXT'
+        })
+        self._ensure_columns('user_patterns', {
+            'most_used_doc_type': 'TEXT'
+        })
+        
+        # Scalar filter columns lifted out of the JSON blobs
+        self._conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_ctx_hour_intent
+            ON comprehensive_context(hour_of_day, primary_intent)
+        ''')
         
+        # In-memory databases are private to each connection, so never skip those
+        if self.db_path != ":memory:":
+            self._schema_initialized.add(self.db_path)
+            
         print("✅ LAW Matrix v4.0 - Contextual awareness database initialized")
         
+    def _ensure_columns(self, table: str, columns: Dict[str, str]):
+        """Add any missing columns to an existing table"""
+        
+        existing = {row['name'] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+        for name, column_type in columns.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+                
     def update_context(self, context: ComprehensiveContext):
         """Update comprehensive user context"""
         
-        # Store in database
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO comprehensive_context 
-            (user_id, session_id, timestamp, ui_state, user_activity, document_state,
-             case_context, session_memory, historical_data, environmental_context,
-             context_confidence, derived_insights)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        # Buffer for the next batched database write
+        self._pending_ctx.append((
             context.user_id,
             context.session_id,
             context.timestamp.isoformat(),
-            json.dumps(asdict(context.ui_state)),
-            json.dumps([asdict(activity) for activity in context.user_activity]),
-            json.dumps(asdict(context.document_state)) if context.document_state else None,
-            json.dumps(asdict(context.case_context)) if context.case_context else None,
-            json.dumps(asdict(context.session_memory)),
-            json.dumps(asdict(context.historical_data)),
-            json.dumps(asdict(context.environmental_context)),
+            _dumps(context.ui_state.to_dict()),
+            _dumps([activity.to_dict() for activity in context.user_activity]),
+            _dumps(context.document_state.to_dict()) if context.document_state else None,
+            _dumps(context.case_context.to_dict()) if context.case_context else None,
+            _dumps(context.session_memory.to_dict()),
+            _dumps(context.historical_data.to_dict()),
+            _dumps(context.environmental_context.to_dict()),
             context.context_confidence,
-            json.dumps(context.derived_insights)
+            _dumps(context.derived_insights),
+            context.timestamp.hour,
+            context.environmental_context.device_type,
+            context.environmental_context.network_status,
+            context.derived_insights.get('primary_intent')
         ))
         
-        conn.commit()
-        conn.close()
+        last_activity = max(context.user_activity, key=_by_timestamp) if context.user_activity else None
+        self._pending_columns.append((
+            context.user_id,
+            context.session_id,
+            context.timestamp,
+            context.derived_insights.get('primary_intent'),
+            context.context_confidence,
+            (context.timestamp - last_activity.timestamp).total_seconds() if last_activity else None,
+            context.timestamp.hour,
+            context.derived_insights.get('case_urgency')
+        ))
+        
+        if (len(self._pending_ctx) >= self.flush_batch_size or
+                time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
         
         # Update in-memory tracking
         self.active_sessions[context.session_id] = context
-        self.context_history.append(context)
+        self.context_history.append((
+            context.timestamp,
+            context.user_id,
+            context.session_id,
+            context.derived_insights.get('primary_intent')
+        ))
         
         # Log context update
         self.logger.info(f"Context updated for user {context.user_id}, session {context.session_id}")
         
+    def flush(self):
+        """Write all buffered contexts and assistance records to the database in a single transaction"""
+        
+        self._last_flush = time.monotonic()
+        if not self._pending_ctx and not self._pending_assist:
+            return
+            
+        pending, self._pending_ctx = self._pending_ctx, []
+        pending_columns, self._pending_columns = self._pending_columns, []
+        pending_assist, self._pending_assist = self._pending_assist, []
+        cursor = self._cur
+        
+        cursor.execute("BEGIN")
+        try:
+            if pending:
+                cursor.executemany(self._CTX_INSERT_SQL, pending)
+            if pending_assist:
+                cursor.executemany(self._ASSIST_INSERT_SQL, pending_assist)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            self._pending_ctx[:0] = pending
+            self._pending_columns[:0] = pending_columns
+            self._pending_assist[:0] = pending_assist
+            raise
+            
+        # The rows are committed; a failed analytics copy must not make the flush fail
+        try:
+            self._write_context_columns(pending_columns)
+        except Exception as e:
+            self.logger.error(f"Failed to write {len(pending_columns)} context rows to the columnar store: {str(e)}")
+            self._close_columns_writer()
+            
+        self.logger.info(f"Flushed {len(pending)} buffered contexts, {len(pending_assist)} assistance records")
+        
+    def _write_context_columns(self, rows: List[Tuple]):
+        """Append flushed context scalars to the columnar analytics store"""
+        
+        if pa is None or not rows:
+            return
+            
+        columns = list(zip(*rows))
+        table = pa.table({
+            'user_id': pa.array(columns[0], type=pa.string()),
+            'session_id': pa.array(columns[1], type=pa.string()),
+            'timestamp': pa.array(columns[2], type=pa.timestamp('us')),
+            'primary_intent': pa.array(columns[3], type=pa.string()),
+            'confidence': pa.array(columns[4], type=pa.float64()),
+            'idle_seconds': pa.array(columns[5], type=pa.float64()),
+            'hour_of_day': pa.array(columns[6], type=pa.int8()),
+            'case_urgency': pa.array(columns[7], type=pa.float64())
+        })
+        
+        if self._columns_writer is None:
+            os.makedirs(self.columns_path, exist_ok=True)
+            file_name = f"part-{time.time_ns()}.parquet"
+            self._columns_writer = pq.ParquetWriter(os.path.join(self.columns_path, file_name), table.schema)
+        self._columns_writer.write_table(table)
+        
+    def _close_columns_writer(self):
+        """Finalize the open Parquet file so readers can see its row groups"""
+        
+        writer, self._columns_writer = self._columns_writer, None
+        if writer is None:
+            return
+            
+        try:
+            writer.close()
+        except Exception as e:
+            self.logger.error(f"Failed to finalize the columnar context file: {str(e)}")
+            
+    def load_context_columns(self, columns: List[str], filter_expression=None):
+        """Read selected scalar context columns for analytics without touching the JSON blobs"""
+        
+        if pa is None:
+            raise RuntimeError("pyarrow is required for columnar context analytics")
+            
+        # Rows written since the last read live in a file without a footer until it is closed
+        self._close_columns_writer()
+        
+        if not os.path.isdir(self.columns_path):
+            return None
+            
+        # Files cut short by a crash have no footer and are skipped
+        dataset = pa_dataset.dataset(self.columns_path, format="parquet", exclude_invalid_files=True)
+        return dataset.to_table(columns=columns, filter=filter_expression)
+        
+    def close(self):
+        """Flush buffered writes and close the database connection"""
+        
+        self.flush()
+        self._close_columns_writer()
+        atexit.unregister(self.flush)
+        atexit.unregister(self._close_columns_writer)
+        self._conn.close()
+        
+    def record_assistance(self, user_id: str, session_id: str, suggestions: List[Dict[str, Any]]):
+        """Buffer proactive assistance suggestions for the next batched write"""
+        
+        for suggestion in suggestions:
+            trigger_context = suggestion.get('trigger_context') or {
+                'priority': suggestion.get('priority'),
+                'message': suggestion.get('message'),
+                'confidence': suggestion.get('confidence')
+            }
+            self._pending_assist.append((
+                user_id,
+                session_id,
+                suggestion['type'],
+                _dumps(trigger_context),
+                _dumps(suggestion.get('suggested_actions', []))
+            ))
+            
+        if (len(self._pending_assist) >= self.flush_batch_size or
+                time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+            
     def capture_ui_state(self, user_id: str, session_id: str, ui_data: Dict[str, Any]) -> UIState:
         """Capture current UI state"""
         
@@ -298,53 +672,33 @@ class LawMatrixContextualAwarenessSystem:
             'recommended_actions': []
         }
         
-        # Analyze recent activities
-        recent_activities = [a for a in context.user_activity 
-                           if (datetime.now() - a.timestamp).seconds < 300]  # Last 5 minutes
-        
-        if not recent_activities:
+        # Collect activity types from the last 5 minutes in a single pass
+        now = datetime.now()
+        recent_types = set()
+        for activity in context.user_activity:
+            if (now - activity.timestamp).total_seconds() < 300:
+                recent_types.add(activity.activity_type)
+                
+        if not recent_types:
             return intent_analysis
             
-        # Pattern recognition for common intents
-        activity_types = [a.activity_type for a in recent_activities]
-        
-        # Document editing intent
-        if ActivityType.DOCUMENT_VIEW in activity_types:
-            intent_analysis['primary_intent'] = 'document_editing'
-            intent_analysis['confidence'] = 0.8
-            intent_analysis['supporting_evidence'].append('User viewing documents')
-            
-            if context.document_state:
-                intent_analysis['recommended_actions'].extend([
-                    'Provide relevant templates',
-                    'Suggest legal precedents',
-                    'Offer document formatting assistance'
-                ])
+        available = {
+            None: True,
+            'document': context.document_state is not None,
+            'case': context.case_context is not None
+        }
+        
+        # Later rules take precedence for the primary intent; evidence and actions accumulate
+        for triggers, intent, confidence, evidence, requires, actions in _INTENT_RULES:
+            if triggers.isdisjoint(recent_types):
+                continue
                 
-        # Legal research intent
-        if ActivityType.SEARCH_PERFORMED in activity_types or ActivityType.QUERY_SUBMITTED in activity_types:
-            intent_analysis['primary_intent'] = 'legal_research'
-            intent_analysis['confidence'] = 0.9
-            intent_analysis['supporting_evidence'].append('User performing searches')
+            intent_analysis['primary_intent'] = intent
+            intent_analysis['confidence'] = confidence
+            intent_analysis['supporting_evidence'].append(evidence)
             
-            intent_analysis['recommended_actions'].extend([
-                'Provide comprehensive legal analysis',
-                'Suggest related case law',
-                'Offer jurisdiction-specific guidance'
-            ])
-            
-        # Case management intent
-        if ActivityType.CASE_OPENED in activity_types:
-            intent_analysis['primary_intent'] = 'case_management'
-            intent_analysis['confidence'] = 0.85
-            intent_analysis['supporting_evidence'].append('User accessing case information')
-            
-            if context.case_context:
-                intent_analysis['recommended_actions'].extend([
-                    'Provide case timeline overview',
-                    'Suggest next legal steps',
-                    'Offer deadline reminders'
-                ])
+            if available[requires]:
+                intent_analysis['recommended_actions'].extend(actions)
                 
         return intent_analysis
         
@@ -352,11 +706,12 @@ class LawMatrixContextualAwarenessSystem:
         """Generate proactive assistance suggestions based on context"""
         
         assistance_suggestions = []
+        now = datetime.now()
         
         # Check for idle time
         if context.user_activity:
-            last_activity = max(context.user_activity, key=lambda x: x.timestamp)
-            idle_time = (datetime.now() - last_activity.timestamp).seconds
+            last_activity = max(context.user_activity, key=_by_timestamp)
+            idle_time = (now - last_activity.timestamp).total_seconds()
             
             if idle_time > self.assistance_thresholds['idle_time']:
                 assistance_suggestions.append({
@@ -371,33 +726,29 @@ class LawMatrixContextualAwarenessSystem:
                     'confidence': 0.7
                 })
                 
-        # Check for complex queries
-        if context.session_memory.conversation_history:
-            recent_queries = [conv for conv in context.session_memory.conversation_history[-5:]]
+        # Check for complex queries - one suggestion regardless of how many are long
+        recent_queries = context.session_memory.conversation_history[-5:]
+        longest_input = max((len(query.get('input') or '') for query in recent_queries), default=0)
+        
+        if longest_input > 200:  # Complex query
+            assistance_suggestions.append({
+                'type': 'complex_query_assistance',
+                'priority': 'high',
+                'message': 'Complex query detected - would you like me to break this down?',
+                'suggested_actions': [
+                    'Provide step-by-step analysis',
+                    'Offer related subtopics',
+                    'Suggest specific legal areas'
+                ],
+                'confidence': 0.9
+            })
             
-            for query in recent_queries:
-                if len(query.get('input', '')) > 200:  # Complex query
-                    assistance_suggestions.append({
-                        'type': 'complex_query_assistance',
-                        'priority': 'high',
-                        'message': 'Complex query detected - would you like me to break this down?',
-                        'suggested_actions': [
-                            'Provide step-by-step analysis',
-                            'Offer related subtopics',
-                            'Suggest specific legal areas'
-                        ],
-                        'confidence': 0.9
-                    })
-                    
         # Check for case urgency
-        if context.case_context and context.case_context.key_dates:
-            upcoming_deadlines = []
-            for date_name, date_value in context.case_context.key_dates.items():
-                if isinstance(date_value, datetime):
-                    days_until = (date_value - datetime.now()).days
-                    if 0 <= days_until <= 7:  # Within a week
-                        upcoming_deadlines.append(date_name)
-                        
+        if context.case_context and context.case_context.key_date_names:
+            time_until = context.case_context.key_date_timestamps - np.datetime64(now, 'us')
+            within_week = (time_until >= np.timedelta64(0, 'D')) & (time_until < np.timedelta64(8, 'D'))
+            upcoming_deadlines = [context.case_context.key_date_names[i] for i in np.flatnonzero(within_week)]
+            
             if upcoming_deadlines:
                 assistance_suggestions.append({
                     'type': 'deadline_reminder',
@@ -432,81 +783,77 @@ class LawMatrixContextualAwarenessSystem:
     def update_user_patterns(self, user_id: str, session_data: Dict[str, Any]):
         """Update user behavior patterns"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Get existing patterns
-        cursor.execute("SELECT * FROM user_patterns WHERE user_id = ?", (user_id,))
-        existing = cursor.fetchone()
-        
-        if existing:
-            # Update existing patterns
-            patterns = {
-                'total_sessions': existing[1] + 1,
-                'average_session_duration': (existing[2] + session_data.get('duration', 0)) / 2,
-                'preferred_features': json.loads(existing[3]) if existing[3] else [],
-                'common_queries': json.loads(existing[4]) if existing[4] else [],
-                'document_types_used': json.loads(existing[5]) if existing[5] else {},
-                'time_patterns': json.loads(existing[6]) if existing[6] else {},
-                'productivity_metrics': json.loads(existing[7]) if existing[7] else {}
-            }
-        else:
-            # Create new patterns
-            patterns = {
-                'total_sessions': 1,
-                'average_session_duration': session_data.get('duration', 0),
-                'preferred_features': [],
-                'common_queries': [],
-                'document_types_used': {},
-                'time_patterns': {},
-                'productivity_metrics': {}
-            }
+        cursor = self._cur
+        
+        # Read and write inside one transaction so concurrent updates cannot interleave
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # Get existing patterns
+            cursor.execute(self._PATTERN_SELECT_SQL, (user_id,))
+            existing = cursor.fetchone()
             
-        # Update patterns with new data
-        if 'features_used' in session_data:
-            patterns['preferred_features'].extend(session_data['features_used'])
+            if existing:
+                # Update existing patterns
+                patterns = {
+                    'preferred_features': _json_or(existing['preferred_features'], []),
+                    'common_queries': _json_or(existing['common_queries'], []),
+                    'document_types_used': _json_or(existing['document_types_used'], {}),
+                    'time_patterns': _decode_time_patterns(existing['time_patterns']),
+                    'productivity_metrics': _json_or(existing['productivity_metrics'], {})
+                }
+            else:
+                # Create new patterns
+                patterns = {
+                    'preferred_features': [],
+                    'common_queries': [],
+                    'document_types_used': {},
+                    'time_patterns': np.zeros(24, dtype=np.int32),
+                    'productivity_metrics': {}
+                }
+                
+            # Update patterns with new data
+            if 'features_used' in session_data:
+                patterns['preferred_features'].extend(session_data['features_used'])
+                
+            if 'queries' in session_data:
+                patterns['common_queries'].extend(session_data['queries'])
+                
+            if 'document_types' in session_data:
+                for doc_type in session_data['document_types']:
+                    patterns['document_types_used'][doc_type] = patterns['document_types_used'].get(doc_type, 0) + 1
+                    
+            # Update time patterns
+            current_hour = datetime.now().hour
+            patterns['time_patterns'][current_hour] += 1
             
-        if 'queries' in session_data:
-            patterns['common_queries'].extend(session_data['queries'])
+            # Cache the most used type so the recommendation path does not recompute it
+            document_types_used = patterns['document_types_used']
+            most_used_type = max(document_types_used, key=document_types_used.get, default=None)
+            
+            # Store updated patterns
+            cursor.execute(self._PATTERN_UPSERT_SQL, (
+                user_id,
+                session_data.get('duration', 0),
+                _dumps(patterns['preferred_features']),
+                _dumps(patterns['common_queries']),
+                _dumps(patterns['document_types_used']),
+                patterns['time_patterns'].tobytes(),
+                _dumps(patterns['productivity_metrics']),
+                most_used_type
+            ))
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
             
-        if 'document_types' in session_data:
-            for doc_type in session_data['document_types']:
-                patterns['document_types_used'][doc_type] = patterns['document_types_used'].get(doc_type, 0) + 1
-                
-        # Update time patterns
-        current_hour = datetime.now().hour
-        patterns['time_patterns'][str(current_hour)] = patterns['time_patterns'].get(str(current_hour), 0) + 1
-        
-        # Store updated patterns
-        cursor.execute('''
-            INSERT OR REPLACE INTO user_patterns 
-            (user_id, total_sessions, average_session_duration, preferred_features,
-             common_queries, document_types_used, time_patterns, productivity_metrics)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            user_id,
-            patterns['total_sessions'],
-            patterns['average_session_duration'],
-            json.dumps(patterns['preferred_features']),
-            json.dumps(patterns['common_queries']),
-            json.dumps(patterns['document_types_used']),
-            json.dumps(patterns['time_patterns']),
-            json.dumps(patterns['productivity_metrics'])
-        ))
-        
-        conn.commit()
-        conn.close()
-        
     def get_contextual_recommendations(self, user_id: str, current_context: Dict[str, Any]) -> Dict[str, Any]:
         """Get personalized recommendations based on user context"""
         
         # Get user patterns
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._cur
         
-        cursor.execute("SELECT * FROM user_patterns WHERE user_id = ?", (user_id,))
+        cursor.execute(self._PATTERN_SELECT_SQL, (user_id,))
         patterns = cursor.fetchone()
-        conn.close()
         
         if not patterns:
             return {'error': 'No user patterns found'}
@@ -519,10 +866,10 @@ class LawMatrixContextualAwarenessSystem:
         }
         
         # Parse patterns
-        preferred_features = json.loads(patterns[3]) if patterns[3] else []
-        common_queries = json.loads(patterns[4]) if patterns[4] else []
-        document_types = json.loads(patterns[5]) if patterns[5] else {}
-        time_patterns = json.loads(patterns[6]) if patterns[6] else {}
+        preferred_features = _json_or(patterns['preferred_features'], [])
+        common_queries = _json_or(patterns['common_queries'], [])
+        most_used_doc_type = patterns['most_used_doc_type']
+        hour_freq = _decode_time_patterns(patterns['time_patterns'])
         
         # Generate personalized recommendations
         if 'document_editing' in preferred_features:
@@ -533,16 +880,15 @@ class LawMatrixContextualAwarenessSystem:
             
         # Time-based suggestions
         current_hour = datetime.now().hour
-        if str(current_hour) in time_patterns and time_patterns[str(current_hour)] > 5:
+        if hour_freq[current_hour] > 5:
             recommendations['time_based_suggestions'].append(
                 f'You typically work at {current_hour}:00 - consider scheduling important tasks now'
             )
             
         # Document type suggestions
-        most_used_type = max(document_types.items(), key=lambda x: x[1]) if document_types else None
-        if most_used_type:
+        if most_used_doc_type:
             recommendations['productivity_tips'].append(
-                f'You frequently use {most_used_type[0]} documents - consider creating custom templates'
+                f'You frequently use {most_used_doc_type} documents - consider creating custom templates'
             )
             
         return recommendations
@@ -563,10 +909,11 @@ class LawMatrixProactiveAssistant:
         user_activity = self.contextual_awareness.capture_user_activity(user_id, interaction_data.get('activity', {}))
         
         # Create comprehensive context
+        now = datetime.now()
         comprehensive_context = ComprehensiveContext(
             user_id=user_id,
             session_id=session_id,
-            timestamp=datetime.now(),
+            timestamp=now,
             ui_state=ui_state,
             user_activity=[user_activity],
             document_state=None,  # Would be populated from real data
@@ -586,12 +933,12 @@ class LawMatrixProactiveAssistant:
                 preferred_features=[],
                 common_queries=[],
                 document_types_used={},
-                time_patterns={},
+                time_patterns=np.zeros(24, dtype=np.int32),
                 productivity_metrics={}
             ),
             environmental_context=EnvironmentalContext(
-                time_of_day=datetime.now().strftime("%H:%M"),
-                day_of_week=datetime.now().strftime("%A"),
+                time_of_day=now.strftime("%H:%M"),
+                day_of_week=now.strftime("%A"),
                 system_performance={},
                 network_status="good",
                 device_type="desktop",
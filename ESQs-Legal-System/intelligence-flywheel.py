@@ -12,26 +12,191 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass, asdict
 import numpy as np
+import orjson
+from functools import lru_cache
 from collections import defaultdict, Counter
 import logging
-from enum import Enum
+import logging.handlers
+import queue
+import atexit
+from enum import IntEnum
+from types import MappingProxyType
 import threading
 import time
+import hashlib
+import itertools
+import re
+import heapq
 
-class FeedbackType(Enum):
-    POSITIVE = "positive"
-    NEGATIVE = "negative"
-    NEUTRAL = "neutral"
-    CORRECTION = "correction"
+try:
+    import uvloop
+except ImportError:  # uvloop is optional and not available on Windows
+    uvloop = None
 
-class ImprovementTrigger(Enum):
-    QUALITY_THRESHOLD = "quality_threshold"
-    USER_SATISFACTION = "user_satisfaction"
-    ERROR_RATE = "error_rate"
-    PERFORMANCE_DEGRADATION = "performance_degradation"
-    SCHEDULED = "scheduled"
+try:
+    from blake3 import blake3 as _id_hasher
+except ImportError:  # fall back to hashlib (SHA-NI accelerated on modern x86)
+    _id_hasher = hashlib.sha256
 
-@dataclass
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick is optional - a compiled regex is used instead
+    ahocorasick = None
+
+try:
+    import numba
+except ImportError:  # numba is optional - the trend falls back to NumPy
+    numba = None
+
+def _dumps(obj: Any) -> str:
+    """Serialize to a JSON string with orjson"""
+    return orjson.dumps(obj).decode()
+
+_JSON_SCALARS = frozenset((str, int, float, bool, type(None)))
+
+@lru_cache(maxsize=1024)
+def _object_json(items: tuple) -> str:
+    """Cached JSON encoding of (key, value type, value) triples as an object"""
+    return _dumps({key: value for key, _, value in items})
+
+@lru_cache(maxsize=1024)
+def _array_json(items: tuple) -> str:
+    """Cached JSON encoding of (value type, value) pairs as an array"""
+    return _dumps([value for _, value in items])
+
+def _encode_json(value: Any) -> str:
+    """Encode a JSON column with orjson, reusing cached encodings for flat scalar values"""
+    
+    # Value types are part of the cache key so that e.g. 1, 1.0 and True stay distinct
+    try:
+        if isinstance(value, dict):
+            if all(type(k) is str and type(v) in _JSON_SCALARS for k, v in value.items()):
+                return _object_json(tuple(sorted((k, type(v), v) for k, v in value.items())))
+        elif isinstance(value, list):
+            if all(type(v) in _JSON_SCALARS for v in value):
+                return _array_json(tuple((type(v), v) for v in value))
+        return _dumps(value)
+    except orjson.JSONEncodeError:  # e.g. integers beyond 64 bits or non-string keys
+        return json.dumps(value)
+
+# Enum values are stored as INTEGER columns; labels are the external string form
+class FeedbackType(IntEnum):
+    POSITIVE = 1
+    NEGATIVE = 2
+    NEUTRAL = 3
+    CORRECTION = 4
+    
+    @property
+    def label(self) -> str:
+        return self.name.lower()
+
+class ImprovementTrigger(IntEnum):
+    QUALITY_THRESHOLD = 1
+    USER_SATISFACTION = 2
+    ERROR_RATE = 3
+    PERFORMANCE_DEGRADATION = 4
+    SCHEDULED = 5
+    
+    @property
+    def label(self) -> str:
+        return self.name.lower()
+
+# Keyword matching for common issues (simplified NLP)
+_ISSUE_KEYWORDS = {
+    'accuracy': ['wrong', 'incorrect', 'inaccurate', 'mistake', 'error'],
+    'relevance': ['irrelevant', 'not helpful', 'off topic', 'unrelated'],
+    'completeness': ['incomplete', 'missing', 'partial', 'unfinished'],
+    'clarity': ['unclear', 'confusing', 'hard to understand', 'complex'],
+    'speed': ['slow', 'delayed', 'takes too long', 'timeout']
+}
+_ISSUE_TYPES = tuple(_ISSUE_KEYWORDS)  # dense issue vocabulary for count arrays
+_ISSUE_INDEX = {issue_type: index for index, issue_type in enumerate(_ISSUE_TYPES)}
+_KEYWORD_ISSUES = {
+    keyword: issue_type
+    for issue_type, keywords in _ISSUE_KEYWORDS.items()
+    for keyword in keywords
+}
+
+def _build_issue_matcher():
+    """Build a single-pass matcher yielding the issue type of every keyword hit"""
+    
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for keyword, issue_type in _KEYWORD_ISSUES.items():
+            automaton.add_word(keyword, issue_type)
+        automaton.make_automaton()
+        return lambda text: (issue_type for _, issue_type in automaton.iter(text))
+        
+    # Lookahead alternation so overlapping keywords are all reported, like the automaton
+    pattern = re.compile('(?=(%s))' % '|'.join(map(re.escape, _KEYWORD_ISSUES)))
+    return lambda text: (_KEYWORD_ISSUES[match.group(1)] for match in pattern.finditer(text))
+
+_match_issues = _build_issue_matcher()
+
+# Satisfaction trend codes returned by _summarize_feedback
+_TREND_LABELS = {1: 'improving', -1: 'declining', 0: 'stable'}
+
+def _summarize_feedback_py(scores, type_codes, type_counts):
+    """Single pass over chronological feedback columns: score total, type counts, low count, trend"""
+    
+    n = len(scores)
+    half = n // 2
+    total = 0.0
+    first_sum = 0.0
+    low = 0
+    for i in range(n):
+        score = scores[i]
+        total += score
+        if i < half:
+            first_sum += score
+        if score < 3.0:
+            low += 1
+        type_counts[type_codes[i]] += 1
+        
+    trend = 0
+    if half > 0:
+        first_avg = first_sum / half
+        second_avg = (total - first_sum) / (n - half)
+        if second_avg > first_avg + 0.2:
+            trend = 1
+        elif second_avg < first_avg - 0.2:
+            trend = -1
+    return total, low, trend
+
+if numba is not None:
+    # No on-disk cache: this file is loaded under ad-hoc module names, which the cache keys on.
+    # No fastmath either, so the summed scores keep their evaluation order.
+    _summarize_feedback = numba.njit(_summarize_feedback_py)
+    
+    # Compile at import so the first analysis batch doesn't pay JIT latency
+    _summarize_feedback(np.zeros(5, dtype=np.float32), np.zeros(5, dtype=np.int8), np.zeros(4, dtype=np.int64))
+else:
+    def _summarize_feedback(scores, type_codes, type_counts):
+        """NumPy equivalent of _summarize_feedback_py for when numba is unavailable"""
+        
+        half = len(scores) // 2
+        type_counts += np.bincount(type_codes, minlength=len(type_counts))
+        trend = 0
+        if half > 0:
+            first_avg = scores[:half].mean()
+            second_avg = scores[half:].mean()
+            if second_avg > first_avg + 0.2:
+                trend = 1
+            elif second_avg < first_avg - 0.2:
+                trend = -1
+        return float(scores.sum(dtype=np.float64)), int(np.count_nonzero(scores < 3.0)), trend
+
+# Priority order: critical, high, medium, low
+_PRIORITY_RANK = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+# Integer codes for feedback types in the vectorized feedback summary
+_FEEDBACK_TYPES = tuple(FeedbackType)
+_FEEDBACK_TYPE_CODES = {feedback_type: code for code, feedback_type in enumerate(_FEEDBACK_TYPES)}
+
+# Direct label -> member lookup, skipping the Enum constructor on the ingest path
+_FEEDBACK_TYPE_BY_LABEL = {feedback_type.label: feedback_type for feedback_type in FeedbackType}
+
+@dataclass(slots=True)
 class FeedbackEntry:
     """Represents user feedback for continuous improvement"""
     id: str
@@ -41,10 +206,10 @@ class FeedbackEntry:
     satisfaction_score: float  # 1-5 scale
     specific_feedback: str
     suggested_improvements: List[str]
-    timestamp: datetime
+    timestamp: float  # epoch seconds, formatted only when written to the database
     context_data: Dict[str, Any]
 
-@dataclass
+@dataclass(slots=True)
 class ImprovementAction:
     """Represents an improvement action to be taken"""
     id: str
@@ -58,7 +223,7 @@ class ImprovementAction:
     created_at: datetime
     completed_at: Optional[datetime] = None
 
-@dataclass
+@dataclass(slots=True)
 class PerformanceBaseline:
     """Represents performance baseline for comparison"""
     metric_name: str
@@ -75,18 +240,64 @@ class LawMatrixIntelligenceFlywheel:
     Implements the complete feedback loop for self-improving AI
     """
     
+    # Statements reused from the connection's prepared statement cache
+    _FEEDBACK_INSERT_SQL = '''
+        INSERT INTO feedback_entries 
+        (id, interaction_id, user_id, feedback_type, satisfaction_score,
+         specific_feedback, suggested_improvements, timestamp, context_data)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    
+    _ACTION_INSERT_SQL = '''
+        INSERT INTO improvement_actions 
+        (id, trigger_type, priority, action_type, description, parameters,
+         estimated_impact, status, created_at, completed_at, results)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    
+    # Enum-valued columns, stored as the enum's integer code
+    _ENUM_COLUMNS = (
+        ('feedback_entries', 'feedback_type', FeedbackType),
+        ('improvement_actions', 'trigger_type', ImprovementTrigger)
+    )
+    
     def __init__(self, db_path: str = "lawmatrix_flywheel.db"):
         self.db_path = db_path
         self.logger = self._setup_logging()
+        
+        # Single long-lived connection shared by sync callers and worker threads
+        self._db_lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            self.db_path, isolation_level=None, check_same_thread=False, cached_statements=256
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
         self._initialize_database()
         
-        # Feedback tracking
-        self.feedback_queue = []
-        self.improvement_queue = []
+        # Write buffering - rows are flushed in a single transaction
+        self._pending_rows = []
+        self._pending_action_rows = []
+        self.flush_batch_size = 128
+        self.flush_interval = 5.0  # seconds
+        self._last_flush = time.monotonic()
+        atexit.register(self.flush)
+        self._last_validated_rowid = 0  # validation only reads actions written after this row
+        
+        # ID generation - per-instance salt plus a monotonically increasing nonce
+        self._id_salt = os.urandom(16)
+        self._id_nonce = itertools.count()
+        
+        # Feedback tracking - entries are handed to the analysis loop through an asyncio.Queue
+        self.feedback_queue = asyncio.Queue()
+        self._loop = None  # event loop that owns feedback_queue, once known
+        self.improvement_queue = []  # heap of (priority rank, created ts, seq, action)
+        self._improvement_seq = itertools.count()
         self.performance_baselines = {}
         
-        # Continuous improvement settings
-        self.improvement_settings = {
+        # Continuous improvement settings - read-only view; change them through
+        # update_improvement_settings so the cached thresholds stay in sync
+        self._improvement_settings = {
             'quality_threshold': 0.8,
             'satisfaction_threshold': 4.0,
             'error_rate_threshold': 0.05,
@@ -94,39 +305,84 @@ class LawMatrixIntelligenceFlywheel:
             'retraining_threshold': 100,  # feedback entries
             'performance_monitoring_window': 7  # days
         }
+        self.improvement_settings = MappingProxyType(self._improvement_settings)
+        self._specialize_improvement_settings()
         
         # Background tasks
         self.is_running = False
         self.background_tasks = []
         
+    def update_improvement_settings(self, **settings):
+        """Update continuous improvement settings and refresh the cached thresholds"""
+        
+        self._improvement_settings.update(settings)
+        self._specialize_improvement_settings()
+        
+    def _specialize_improvement_settings(self):
+        """Cache the threshold scalars and parameter templates used by the action generators"""
+        
+        self._satisfaction_threshold = float(self.improvement_settings['satisfaction_threshold'])
+        self._retraining_threshold = int(self.improvement_settings['retraining_threshold'])
+        self._satisfaction_params = {'target_metric': 'satisfaction', 'threshold': self._satisfaction_threshold}
+        self._trend_decline_params = {'trend': 'declining'}
+        
     def _setup_logging(self) -> logging.Logger:
         """Setup logging for the intelligence flywheel"""
         
         logger = logging.getLogger('LawMatrixIntelligenceFlywheel')
         logger.setLevel(logging.INFO)
         
+        # The logger is shared, so only the first instance wires up handlers
+        if logger.handlers:
+            return logger
+            
         handler = logging.FileHandler('logs/intelligence_flywheel.log')
         formatter = logging.Formatter(
             '{"timestamp": "%(asctime)s", "level": "%(levelname)s", "component": "flywheel", "message": "%(message)s"}'
         )
         handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        
+        # Records are queued and written by a listener thread, so the background
+        # loops never block on the file handler's lock or disk writes
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, handler)
+        listener.start()
+        atexit.register(listener.stop)
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
         
         return logger
         
     def _initialize_database(self):
         """Initialize database for intelligence flywheel"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
+        cursor.execute("BEGIN")
+        try:
+            self._create_schema(cursor)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+            
+        print("✅ LAW Matrix v4.0 - Intelligence flywheel database initialized")
+        
+    def _create_schema(self, cursor: sqlite3.Cursor):
+        """Create tables and indexes, migrating legacy TEXT enum columns to INTEGER"""
         
+        # Tables from before enum columns were INTEGER are moved aside and copied back below
+        legacy_tables = []
+        for table, column, enum_type in self._ENUM_COLUMNS:
+            if self._column_type(cursor, table, column) == 'TEXT':
+                cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+                legacy_tables.append((table, column, enum_type))
+                
         # Create feedback table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS feedback_entries (
                 id TEXT PRIMARY KEY,
                 interaction_id TEXT NOT NULL,
                 user_id TEXT NOT NULL,
-                feedback_type TEXT NOT NULL,
+                feedback_type INTEGER NOT NULL,
                 satisfaction_score REAL NOT NULL,
                 specific_feedback TEXT,
                 suggested_improvements TEXT,
@@ -141,7 +397,7 @@ class LawMatrixIntelligenceFlywheel:
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS improvement_actions (
                 id TEXT PRIMARY KEY,
-                trigger_type TEXT NOT NULL,
+                trigger_type INTEGER NOT NULL,
                 priority TEXT NOT NULL,
                 action_type TEXT NOT NULL,
                 description TEXT NOT NULL,
@@ -181,15 +437,38 @@ class LawMatrixIntelligenceFlywheel:
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        # Copy legacy rows, mapping enum labels to their integer codes. This must
+        # happen before index creation, since the legacy table still owns the old index
+        for table, column, enum_type in legacy_tables:
+            columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table}_legacy)")]
+            cases = ' '.join(f"WHEN '{member.label}' THEN {int(member)}" for member in enum_type)
+            select_list = ', '.join(
+                f"CASE {name} {cases} ELSE {name} END" if name == column else name
+                for name in columns
+            )
+            cursor.execute(f"INSERT INTO {table} ({', '.join(columns)}) SELECT {select_list} FROM {table}_legacy")
+            cursor.execute(f"DROP TABLE {table}_legacy")
+            
+        # Index for the quality assurance scan of completed actions
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_actions_completed
+            ON improvement_actions (status, completed_at)
+        ''')
         
-        print("✅ LAW Matrix v4.0 - Intelligence flywheel database initialized")
+    @staticmethod
+    def _column_type(cursor: sqlite3.Cursor, table: str, column: str) -> Optional[str]:
+        """Declared type of a column, or None if the table or column doesn't exist"""
+        
+        for row in cursor.execute(f"PRAGMA table_info({table})"):
+            if row[1] == column:
+                return row[2].upper()
+        return None
         
     async def start_continuous_improvement(self):
         """Start the continuous improvement background processes"""
         
         self.is_running = True
+        self._loop = asyncio.get_running_loop()
         self.logger.info("🚀 Starting LAW Matrix v4.0 Intelligence Flywheel")
         
         # Start background tasks
@@ -213,6 +492,9 @@ class LawMatrixIntelligenceFlywheel:
             if not task.done():
                 task.cancel()
                 
+        # Persist anything still buffered
+        await asyncio.to_thread(self.flush)
+        
     def collect_feedback(self, interaction_id: str, user_id: str, feedback_data: Dict[str, Any]):
         """Collect user feedback for continuous improvement"""
         
@@ -220,42 +502,106 @@ class LawMatrixIntelligenceFlywheel:
             id=self._generate_feedback_id(interaction_id, user_id),
             interaction_id=interaction_id,
             user_id=user_id,
-            feedback_type=FeedbackType(feedback_data.get('type', 'neutral')),
+            feedback_type=self._parse_feedback_type(feedback_data.get('type', 'neutral')),
             satisfaction_score=feedback_data.get('satisfaction_score', 3.0),
             specific_feedback=feedback_data.get('specific_feedback', ''),
             suggested_improvements=feedback_data.get('suggested_improvements', []),
-            timestamp=datetime.now(),
+            timestamp=time.time(),
             context_data=feedback_data.get('context', {})
         )
         
-        # Store in database
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # Buffer for the next batched database write
+        with self._db_lock:
+            self._pending_rows.append((
+                feedback_entry.id,
+                feedback_entry.interaction_id,
+                feedback_entry.user_id,
+                int(feedback_entry.feedback_type),
+                feedback_entry.satisfaction_score,
+                feedback_entry.specific_feedback,
+                _encode_json(feedback_entry.suggested_improvements),
+                feedback_entry.timestamp,
+                _encode_json(feedback_entry.context_data)
+            ))
+        self._maybe_flush()
         
-        cursor.execute('''
-            INSERT INTO feedback_entries 
-            (id, interaction_id, user_id, feedback_type, satisfaction_score,
-             specific_feedback, suggested_improvements, timestamp, context_data)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            feedback_entry.id,
-            feedback_entry.interaction_id,
-            feedback_entry.user_id,
-            feedback_entry.feedback_type.value,
-            feedback_entry.satisfaction_score,
-            feedback_entry.specific_feedback,
-            json.dumps(feedback_entry.suggested_improvements),
-            feedback_entry.timestamp.isoformat(),
-            json.dumps(feedback_entry.context_data)
-        ))
+        # Add to processing queue
+        self._enqueue_feedback(feedback_entry)
         
-        conn.commit()
-        conn.close()
+        self.logger.info(f"Feedback collected: {feedback_entry.feedback_type.label}, score: {feedback_entry.satisfaction_score}")
         
-        # Add to processing queue
-        self.feedback_queue.append(feedback_entry)
+    @staticmethod
+    def _parse_feedback_type(value: Any) -> FeedbackType:
+        """Resolve a feedback type label or code; unknown values raise ValueError like FeedbackType(value)"""
+        
+        try:
+            return _FEEDBACK_TYPE_BY_LABEL[value]
+        except (KeyError, TypeError):
+            return FeedbackType(value)
         
-        self.logger.info(f"Feedback collected: {feedback_entry.feedback_type.value}, score: {feedback_entry.satisfaction_score}")
+    async def collect_feedback_async(self, interaction_id: str, user_id: str, feedback_data: Dict[str, Any]):
+        """Collect feedback from async code without blocking the event loop on a flush"""
+        
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        await asyncio.to_thread(self.collect_feedback, interaction_id, user_id, feedback_data)
+        
+    def _enqueue_feedback(self, feedback_entry: FeedbackEntry):
+        """Put a feedback entry on the queue, marshalling onto the owning loop from other threads"""
+        
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+            
+        if self._loop is None or self._loop is running_loop or self._loop.is_closed():
+            self.feedback_queue.put_nowait(feedback_entry)
+        else:
+            self._loop.call_soon_threadsafe(self.feedback_queue.put_nowait, feedback_entry)
+            
+    def _maybe_flush(self):
+        """Flush buffered rows once the batch is full or the flush interval has elapsed"""
+        
+        pending = len(self._pending_rows) + len(self._pending_action_rows)
+        if pending >= self.flush_batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+            
+    def flush(self):
+        """Write all buffered feedback and improvement rows in a single transaction"""
+        
+        with self._db_lock:
+            self._last_flush = time.monotonic()
+            if not self._pending_rows and not self._pending_action_rows:
+                return
+                
+            feedback_rows, self._pending_rows = self._pending_rows, []
+            action_rows, self._pending_action_rows = self._pending_action_rows, []
+            cursor = self._conn.cursor()
+            
+            cursor.execute("BEGIN")
+            try:
+                if feedback_rows:
+                    # Buffered rows carry epoch timestamps; stored as ISO strings
+                    cursor.executemany(self._FEEDBACK_INSERT_SQL, [
+                        row[:7] + (datetime.fromtimestamp(row[7]).isoformat(),) + row[8:]
+                        for row in feedback_rows
+                    ])
+                if action_rows:
+                    cursor.executemany(self._ACTION_INSERT_SQL, action_rows)
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                self._pending_rows[:0] = feedback_rows
+                self._pending_action_rows[:0] = action_rows
+                raise
+                
+    def close(self):
+        """Flush buffered writes and close the database connection"""
+        
+        with self._db_lock:
+            self.flush()
+            atexit.unregister(self.flush)
+            self._conn.close()
         
     async def _feedback_analysis_loop(self):
         """Continuously analyze feedback for improvement opportunities"""
@@ -263,7 +609,7 @@ class LawMatrixIntelligenceFlywheel:
         while self.is_running:
             try:
                 # Process feedback queue
-                if self.feedback_queue:
+                if not self.feedback_queue.empty():
                     await self._analyze_feedback_batch()
                     
                 # Check for improvement triggers
@@ -279,11 +625,16 @@ class LawMatrixIntelligenceFlywheel:
     async def _analyze_feedback_batch(self):
         """Analyze a batch of feedback entries"""
         
-        if not self.feedback_queue:
+        # Drain everything queued so far
+        drained = []
+        while not self.feedback_queue.empty():
+            drained.append(self.feedback_queue.get_nowait())
+            
+        if not drained:
             return
             
         # Get recent feedback
-        recent_feedback = self.feedback_queue[-50:]  # Last 50 entries
+        recent_feedback = drained[-50:]  # Last 50 entries
         
         # Analyze patterns
         feedback_analysis = self._analyze_feedback_patterns(recent_feedback)
@@ -292,10 +643,8 @@ class LawMatrixIntelligenceFlywheel:
         improvement_actions = self._generate_improvement_actions(feedback_analysis)
         
         # Add to improvement queue
-        self.improvement_queue.extend(improvement_actions)
-        
-        # Clear processed feedback
-        self.feedback_queue = []
+        for action in improvement_actions:
+            self._queue_improvement_action(action)
         
         self.logger.info(f"Analyzed {len(recent_feedback)} feedback entries, generated {len(improvement_actions)} improvement actions")
         
@@ -305,13 +654,25 @@ class LawMatrixIntelligenceFlywheel:
         if not feedback_entries:
             return {}
             
+        # Numeric fields as column arrays, in chronological order, summarized in a single pass
+        count = len(feedback_entries)
+        scores = np.fromiter((entry.satisfaction_score for entry in feedback_entries), dtype=np.float32, count=count)
+        type_codes = np.fromiter(
+            (_FEEDBACK_TYPE_CODES[entry.feedback_type] for entry in feedback_entries), dtype=np.int8, count=count
+        )
+        type_counts = np.zeros(len(_FEEDBACK_TYPES), dtype=np.int64)
+        total, low_satisfaction, trend = _summarize_feedback(scores, type_codes, type_counts)
+        
         analysis = {
             'total_feedback': len(feedback_entries),
-            'average_satisfaction': np.mean([f.satisfaction_score for f in feedback_entries]),
-            'feedback_distribution': Counter([f.feedback_type.value for f in feedback_entries]),
-            'common_issues': Counter(),
+            'average_satisfaction': total / len(feedback_entries),
+            'feedback_distribution': Counter({
+                feedback_type.label: int(count)
+                for feedback_type, count in zip(_FEEDBACK_TYPES, type_counts) if count
+            }),
+            'common_issues': np.zeros(len(_ISSUE_TYPES), dtype=np.int32),  # indexed like _ISSUE_TYPES
             'improvement_suggestions': Counter(),
-            'satisfaction_trend': self._calculate_satisfaction_trend(feedback_entries),
+            'satisfaction_trend': _TREND_LABELS[trend] if len(feedback_entries) >= 5 else 'insufficient_data',
             'quality_issues': []
         }
         
@@ -321,15 +682,14 @@ class LawMatrixIntelligenceFlywheel:
                 # Simple keyword analysis (in production, use NLP)
                 issues = self._extract_issues_from_feedback(entry.specific_feedback)
                 for issue in issues:
-                    analysis['common_issues'][issue] += 1
+                    analysis['common_issues'][_ISSUE_INDEX[issue]] += 1
                     
             # Collect improvement suggestions
             for suggestion in entry.suggested_improvements:
                 analysis['improvement_suggestions'][suggestion] += 1
                 
         # Identify quality issues
-        low_satisfaction = [f for f in feedback_entries if f.satisfaction_score < 3.0]
-        if len(low_satisfaction) > len(feedback_entries) * 0.2:  # More than 20% low satisfaction
+        if low_satisfaction > len(feedback_entries) * 0.2:  # More than 20% low satisfaction
             analysis['quality_issues'].append('high_low_satisfaction_rate')
             
         return analysis
@@ -337,69 +697,36 @@ class LawMatrixIntelligenceFlywheel:
     def _extract_issues_from_feedback(self, feedback_text: str) -> List[str]:
         """Extract issues from feedback text (simplified NLP)"""
         
-        issues = []
-        feedback_lower = feedback_text.lower()
-        
-        # Simple keyword matching for common issues
-        issue_keywords = {
-            'accuracy': ['wrong', 'incorrect', 'inaccurate', 'mistake', 'error'],
-            'relevance': ['irrelevant', 'not helpful', 'off topic', 'unrelated'],
-            'completeness': ['incomplete', 'missing', 'partial', 'unfinished'],
-            'clarity': ['unclear', 'confusing', 'hard to understand', 'complex'],
-            'speed': ['slow', 'delayed', 'takes too long', 'timeout']
-        }
-        
-        for issue_type, keywords in issue_keywords.items():
-            if any(keyword in feedback_lower for keyword in keywords):
-                issues.append(issue_type)
-                
-        return issues
-        
-    def _calculate_satisfaction_trend(self, feedback_entries: List[FeedbackEntry]) -> str:
-        """Calculate satisfaction trend over time"""
-        
-        if len(feedback_entries) < 5:
-            return 'insufficient_data'
-            
-        # Sort by timestamp
-        sorted_feedback = sorted(feedback_entries, key=lambda x: x.timestamp)
-        
-        # Calculate trend
-        first_half = sorted_feedback[:len(sorted_feedback)//2]
-        second_half = sorted_feedback[len(sorted_feedback)//2:]
-        
-        first_avg = np.mean([f.satisfaction_score for f in first_half])
-        second_avg = np.mean([f.satisfaction_score for f in second_half])
+        found = set(_match_issues(feedback_text.lower()))
+        return [issue_type for issue_type in _ISSUE_KEYWORDS if issue_type in found]
         
-        if second_avg > first_avg + 0.2:
-            return 'improving'
-        elif second_avg < first_avg - 0.2:
-            return 'declining'
-        else:
-            return 'stable'
-            
     def _generate_improvement_actions(self, feedback_analysis: Dict[str, Any]) -> List[ImprovementAction]:
         """Generate improvement actions based on feedback analysis"""
         
         actions = []
+        now = datetime.now()
         
         # Check satisfaction threshold
-        if feedback_analysis.get('average_satisfaction', 5.0) < self.improvement_settings['satisfaction_threshold']:
+        if feedback_analysis.get('average_satisfaction', 5.0) < self._satisfaction_threshold:
             actions.append(ImprovementAction(
                 id=self._generate_action_id('satisfaction'),
                 trigger_type=ImprovementTrigger.USER_SATISFACTION,
                 priority='high',
                 action_type='retrain',
                 description=f"Low satisfaction score: {feedback_analysis['average_satisfaction']:.2f}",
-                parameters={'target_metric': 'satisfaction', 'threshold': self.improvement_settings['satisfaction_threshold']},
+                parameters=self._satisfaction_params.copy(),
                 estimated_impact=0.3,
                 status='pending',
-                created_at=datetime.now()
+                created_at=now
             ))
             
-        # Check for common issues
-        common_issues = feedback_analysis.get('common_issues', Counter())
-        for issue, count in common_issues.most_common(3):
+        # Check for common issues - top 3 by count via partial selection
+        issue_counts = feedback_analysis.get('common_issues', np.zeros(len(_ISSUE_TYPES), dtype=np.int32))
+        top_k = min(3, len(issue_counts))
+        top_issues = np.argpartition(-issue_counts, top_k - 1)[:top_k]
+        top_issues = top_issues[np.lexsort((top_issues, -issue_counts[top_issues]))]  # count desc, vocab order
+        for issue_index in top_issues:
+            issue, count = _ISSUE_TYPES[issue_index], int(issue_counts[issue_index])
             if count > 5:  # Issue mentioned more than 5 times
                 actions.append(ImprovementAction(
                     id=self._generate_action_id(f'issue_{issue}'),
@@ -410,22 +737,21 @@ class LawMatrixIntelligenceFlywheel:
                     parameters={'issue_type': issue, 'frequency': count},
                     estimated_impact=0.2,
                     status='pending',
-                    created_at=datetime.now()
+                    created_at=now
                 ))
                 
         # Check satisfaction trend
-        trend = feedback_analysis.get('satisfaction_trend', 'stable')
-        if trend == 'declining':
+        if feedback_analysis.get('satisfaction_trend', 'stable') == 'declining':
             actions.append(ImprovementAction(
                 id=self._generate_action_id('trend_decline'),
                 trigger_type=ImprovementTrigger.PERFORMANCE_DEGRADATION,
                 priority='critical',
                 action_type='retrain',
                 description="Satisfaction trend is declining",
-                parameters={'trend': trend},
+                parameters=self._trend_decline_params.copy(),
                 estimated_impact=0.4,
                 status='pending',
-                created_at=datetime.now()
+                created_at=now
             ))
             
         return actions
@@ -433,9 +759,11 @@ class LawMatrixIntelligenceFlywheel:
     async def _check_improvement_triggers(self):
         """Check for various improvement triggers"""
         
+        now = datetime.now()
+        
         # Check feedback volume trigger
-        feedback_count = len(self.feedback_queue)
-        if feedback_count >= self.improvement_settings['retraining_threshold']:
+        feedback_count = self.feedback_queue.qsize()
+        if feedback_count >= self._retraining_threshold:
             action = ImprovementAction(
                 id=self._generate_action_id('volume_trigger'),
                 trigger_type=ImprovementTrigger.SCHEDULED,
@@ -445,9 +773,9 @@ class LawMatrixIntelligenceFlywheel:
                 parameters={'feedback_count': feedback_count},
                 estimated_impact=0.25,
                 status='pending',
-                created_at=datetime.now()
+                created_at=now
             )
-            self.improvement_queue.append(action)
+            self._queue_improvement_action(action)
             
         # Check performance baselines
         for metric_name, baseline in self.performance_baselines.items():
@@ -461,9 +789,9 @@ class LawMatrixIntelligenceFlywheel:
                     parameters={'metric': metric_name, 'current': baseline.current_value, 'baseline': baseline.baseline_value},
                     estimated_impact=0.3,
                     status='pending',
-                    created_at=datetime.now()
+                    created_at=now
                 )
-                self.improvement_queue.append(action)
+                self._queue_improvement_action(action)
                 
     async def _performance_monitoring_loop(self):
         """Continuously monitor system performance"""
@@ -492,6 +820,7 @@ class LawMatrixIntelligenceFlywheel:
             'error_rate': 0.02,
             'response_time': 2.5
         }
+        now = datetime.now()
         
         for metric_name, current_value in current_metrics.items():
             if metric_name not in self.performance_baselines:
@@ -503,13 +832,13 @@ class LawMatrixIntelligenceFlywheel:
                     trend_direction='stable',
                     confidence_level=0.8,
                     measurement_period=7,
-                    last_updated=datetime.now()
+                    last_updated=now
                 )
             else:
                 # Update existing baseline
                 baseline = self.performance_baselines[metric_name]
                 baseline.current_value = current_value
-                baseline.last_updated = datetime.now()
+                baseline.last_updated = now
                 
                 # Calculate trend
                 if current_value > baseline.baseline_value * 1.05:
@@ -526,9 +855,12 @@ class LawMatrixIntelligenceFlywheel:
             try:
                 if self.improvement_queue:
                     # Process highest priority action
-                    action = self._get_next_improvement_action()
-                    if action:
-                        await self._execute_improvement_action(action)
+                    action = heapq.heappop(self.improvement_queue)[-1]
+                    await self._execute_improvement_action(action)
+                    
+                    # One transaction per tick for the buffered result rows; flushing
+                    # may block on disk, so keep it off the event loop
+                    await asyncio.to_thread(self.flush)
                         
                 # Sleep before next iteration
                 await asyncio.sleep(600)  # 10 minutes
@@ -537,22 +869,21 @@ class LawMatrixIntelligenceFlywheel:
                 self.logger.error(f"Error in improvement execution loop: {str(e)}")
                 await asyncio.sleep(300)  # 5 minutes on error
                 
+    def _queue_improvement_action(self, action: ImprovementAction):
+        """Push an improvement action onto the priority queue"""
+        
+        heapq.heappush(self.improvement_queue, (
+            _PRIORITY_RANK.get(action.priority, 4),
+            action.created_at.timestamp(),
+            next(self._improvement_seq),
+            action
+        ))
+        
     def _get_next_improvement_action(self) -> Optional[ImprovementAction]:
         """Get the next improvement action to execute"""
         
-        if not self.improvement_queue:
-            return None
-            
-        # Priority order: critical, high, medium, low
-        priority_order = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
-        
-        # Sort by priority and creation time
-        sorted_actions = sorted(
-            self.improvement_queue,
-            key=lambda x: (priority_order.get(x.priority, 4), x.created_at)
-        )
-        
-        return sorted_actions[0] if sorted_actions else None
+        # Heap head is the highest priority, oldest action
+        return self.improvement_queue[0][-1] if self.improvement_queue else None
         
     async def _execute_improvement_action(self, action: ImprovementAction):
         """Execute an improvement action"""
@@ -583,9 +914,6 @@ class LawMatrixIntelligenceFlywheel:
             action.status = 'failed'
             action.completed_at = datetime.now()
             self.logger.error(f"Failed to execute improvement action {action.id}: {str(e)}")
-            
-        # Remove from queue
-        self.improvement_queue.remove(action)
         
     async def _execute_retraining(self, action: ImprovementAction):
         """Execute model retraining"""
@@ -632,31 +960,21 @@ class LawMatrixIntelligenceFlywheel:
     async def _record_improvement_results(self, action: ImprovementAction):
         """Record the results of an improvement action"""
         
-        # Store in database
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO improvement_actions 
-            (id, trigger_type, priority, action_type, description, parameters,
-             estimated_impact, status, created_at, completed_at, results)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            action.id,
-            action.trigger_type.value,
-            action.priority,
-            action.action_type,
-            action.description,
-            json.dumps(action.parameters),
-            action.estimated_impact,
-            action.status,
-            action.created_at.isoformat(),
-            action.completed_at.isoformat() if action.completed_at else None,
-            json.dumps({'execution_time': (action.completed_at - action.created_at).total_seconds() if action.completed_at else None})
-        ))
-        
-        conn.commit()
-        conn.close()
+        # Buffer for the next batched database write
+        with self._db_lock:
+            self._pending_action_rows.append((
+                action.id,
+                int(action.trigger_type),
+                action.priority,
+                action.action_type,
+                action.description,
+                _encode_json(action.parameters),
+                action.estimated_impact,
+                action.status,
+                action.created_at.isoformat(),
+                action.completed_at.isoformat() if action.completed_at else None,
+                _encode_json({'execution_time': (action.completed_at - action.created_at).total_seconds() if action.completed_at else None})
+            ))
         
     async def _quality_assurance_loop(self):
         """Quality assurance and validation loop"""
@@ -676,18 +994,8 @@ class LawMatrixIntelligenceFlywheel:
     async def _validate_improvement_results(self):
         """Validate the results of improvement actions"""
         
-        # Get recent completed actions
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM improvement_actions 
-            WHERE status = 'completed' 
-            AND completed_at >= datetime('now', '-24 hours')
-        ''')
-        
-        recent_actions = cursor.fetchall()
-        conn.close()
+        # Get recent completed actions without blocking the event loop
+        recent_actions = await asyncio.to_thread(self._fetch_recent_completed_actions)
         
         for action_data in recent_actions:
             action_id = action_data[0]
@@ -704,29 +1012,55 @@ class LawMatrixIntelligenceFlywheel:
             
             self.logger.info(f"Validated improvement action: {action_id}")
             
+    def _fetch_recent_completed_actions(self) -> List[Tuple]:
+        """Read completed improvement actions from the last 24 hours not yet validated"""
+        
+        with self._db_lock:
+            # Make buffered results visible before reading them back
+            self.flush()
+            
+            cursor = self._conn.cursor()
+            cursor.execute('''
+                SELECT rowid, * FROM improvement_actions 
+                WHERE status = 'completed' 
+                AND completed_at >= datetime('now', '-24 hours')
+                AND rowid > ?
+                ORDER BY rowid
+            ''', (self._last_validated_rowid,))
+            rows = cursor.fetchall()
+            
+            if rows:
+                self._last_validated_rowid = rows[-1][0]
+            return [row[1:] for row in rows]
+            
     def _generate_feedback_id(self, interaction_id: str, user_id: str) -> str:
         """Generate unique feedback ID"""
         
-        import hashlib
-        content = f"{interaction_id}_{user_id}_{datetime.now().isoformat()}"
-        return hashlib.md5(content.encode()).hexdigest()
+        return self._hash_id(interaction_id.encode(), b'\x00', user_id.encode())
         
     def _generate_action_id(self, action_type: str) -> str:
         """Generate unique action ID"""
         
-        import hashlib
-        content = f"{action_type}_{datetime.now().isoformat()}"
-        return hashlib.md5(content.encode()).hexdigest()
+        return self._hash_id(action_type.encode())
+        
+    def _hash_id(self, *parts: bytes) -> str:
+        """Hash ID parts with the instance salt and next nonce into a 32-char hex ID"""
+        
+        hasher = _id_hasher(self._id_salt)
+        for part in parts:
+            hasher.update(part)
+        hasher.update(next(self._id_nonce).to_bytes(8, 'little'))
+        return hasher.hexdigest()[:32]
         
     def get_flywheel_status(self) -> Dict[str, Any]:
         """Get current status of the intelligence flywheel"""
         
         return {
             'is_running': self.is_running,
-            'feedback_queue_size': len(self.feedback_queue),
+            'feedback_queue_size': self.feedback_queue.qsize(),
             'improvement_queue_size': len(self.improvement_queue),
             'performance_baselines': {name: asdict(baseline) for name, baseline in self.performance_baselines.items()},
-            'improvement_settings': self.improvement_settings,
+            'improvement_settings': dict(self.improvement_settings),
             'background_tasks_running': len([t for t in self.background_tasks if not t.done()])
         }
 
@@ -763,5 +1097,7 @@ if __name__ == "__main__":
         # Stop the flywheel
         await flywheel.stop_continuous_improvement()
         
-    # Run the example
+    # Run the example on uvloop when available
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     asyncio.run(main())
@@ -5,16 +5,40 @@ Robust monitoring and feedback loop for continuous improvement
 """
 
 import os
-import json
 import sqlite3
-import hashlib
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Mapping, Optional, Tuple
 from dataclasses import dataclass, asdict
 import numpy as np
-from collections import defaultdict, Counter
+import orjson
+from collections import defaultdict, Counter, deque, OrderedDict
 import logging
+import logging.handlers
+import queue
+import threading
+import time
+import atexit
 from enum import Enum
+from operator import attrgetter
+
+_DAY_MS = 86_400_000
+
+# Bumped whenever _initialize_database gains a one-off data migration (PRAGMA user_version)
+_SCHEMA_VERSION = 1
+
+def _epoch_ms(moment: datetime) -> int:
+    """Convert a datetime (naive values are local time) to Unix epoch milliseconds"""
+    return int(moment.timestamp() * 1000)
+
+def _json_default(obj: Any) -> Any:
+    """Serialize read-only mapping views (e.g. MappingProxyType) as JSON objects"""
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def _dumps(obj: Any) -> str:
+    """Serialize to a JSON string with orjson"""
+    return orjson.dumps(obj, default=_json_default).decode()
 
 class InteractionType(Enum):
     QUERY = "query"
@@ -28,7 +52,10 @@ class QualityMetric(Enum):
     COMPLETENESS = "completeness"
     CLARITY = "clarity"
 
-@dataclass
+# Enum .value goes through a descriptor on every access; resolve it once per member
+_INTERACTION_TYPE_VALUES = {member: member.value for member in InteractionType}
+
+@dataclass(slots=True)
 class InteractionLog:
     """Represents a single user interaction with the AI system"""
     id: str
@@ -46,7 +73,14 @@ class InteractionLog:
     user_feedback: Optional[Dict[str, Any]] = None
     error_details: Optional[str] = None
 
-@dataclass
+# All InteractionLog fields in interactions-table column order, read in one C call
+_interaction_fields = attrgetter(
+    'id', 'user_id', 'session_id', 'timestamp', 'interaction_type', 'input_data', 'output_data',
+    'processing_time_ms', 'tokens_used', 'model_version', 'context_data', 'quality_scores',
+    'user_feedback', 'error_details'
+)
+
+@dataclass(slots=True)
 class PerformanceMetrics:
     """Aggregated performance metrics"""
     total_interactions: int
@@ -63,14 +97,44 @@ class LawMatrixObservabilitySystem:
     Tracks, analyzes, and improves AI performance continuously
     """
     
+    # Hot-path statements; constant strings hit the connection's statement cache
+    _INSERT_SQL = '''
+        INSERT INTO interactions 
+        (id, user_id, session_id, timestamp, interaction_type, input_data, output_data,
+         processing_time_ms, tokens_used, model_version, context_data, quality_scores,
+         user_feedback, error_details)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    
+    _FEEDBACK_UPDATE_SQL = '''
+        UPDATE interactions 
+        SET user_feedback = ? 
+        WHERE id = ?
+    '''
+    
     def __init__(self, db_path: str = "lawmatrix_observability.db"):
         self.db_path = db_path
         self.logger = self._setup_logging()
+        
+        # Single long-lived connection, shared across threads under the lock
+        self._db_lock = threading.RLock()
+        self._conn = self._connect()
         self._initialize_database()
         
-        # Performance tracking
-        self.session_metrics = defaultdict(list)
-        self.user_patterns = defaultdict(list)
+        # Write buffering - interaction rows and feedback updates are flushed in a single transaction
+        self._pending_rows = []
+        self._pending_feedback = []
+        self.flush_batch_size = 100
+        self.flush_interval = 1.0  # seconds
+        self._last_flush = time.monotonic()
+        atexit.register(self.flush)
+        
+        # Performance tracking - bounded per-key windows, least recently used keys evicted
+        self.session_window = 100
+        self.user_window = 1000
+        self.max_tracked_keys = 10000
+        self.session_metrics = OrderedDict()
+        self.user_patterns = OrderedDict()
         self.error_patterns = defaultdict(int)
         self.quality_trends = defaultdict(list)
         
@@ -80,6 +144,10 @@ class LawMatrixObservabilitySystem:
         logger = logging.getLogger('LawMatrixObservability')
         logger.setLevel(logging.INFO)
         
+        # The logger is shared, so only the first instance wires up handlers
+        if logger.handlers:
+            return logger
+            
         # File handler for detailed logs
         file_handler = logging.FileHandler('lawmatrix_observability.log')
         file_handler.setLevel(logging.INFO)
@@ -90,15 +158,41 @@ class LawMatrixObservabilitySystem:
         )
         file_handler.setFormatter(formatter)
         
-        logger.addHandler(file_handler)
+        # Records are queued and formatted/written by a listener thread, so
+        # log_interaction never blocks on the file handler's lock or disk writes
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, file_handler)
+        listener.start()
+        atexit.register(listener.stop)
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
         
         return logger
         
+    def _connect(self) -> sqlite3.Connection:
+        """Open an autocommit connection with the tuning PRAGMAs applied"""
+        
+        conn = sqlite3.connect(
+            self.db_path, isolation_level=None, check_same_thread=False, cached_statements=256
+        )
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA synchronous=NORMAL")  # safe with WAL, no fsync per commit
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-64000")  # 64 MB page cache
+        conn.execute("PRAGMA mmap_size=268435456")  # 256 MB memory-mapped I/O
+        conn.execute("PRAGMA wal_autocheckpoint=10000")  # pages; fewer, larger checkpoints
+        return conn
+        
     def _initialize_database(self):
         """Initialize SQLite database for observability data"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
+        
+        # Larger pages pack the JSON payload columns better; only takes effect
+        # on a new database, before WAL mode is enabled
+        cursor.execute("PRAGMA page_size=8192")
+        
+        # WAL mode is persistent in the database file, so it only needs setting once
+        cursor.execute("PRAGMA journal_mode=WAL")
         
         # Create interactions table
         cursor.execute('''
@@ -106,7 +200,7 @@ class LawMatrixObservabilitySystem:
                 id TEXT PRIMARY KEY,
                 user_id TEXT NOT NULL,
                 session_id TEXT NOT NULL,
-                timestamp TIMESTAMP NOT NULL,
+                timestamp INTEGER NOT NULL,  -- Unix epoch milliseconds
                 interaction_type TEXT NOT NULL,
                 input_data TEXT NOT NULL,
                 output_data TEXT NOT NULL,
@@ -161,209 +255,305 @@ class LawMatrixObservabilitySystem:
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        # Migrate rows written before timestamps were stored as epoch milliseconds;
+        # legacy ISO strings are naive local time. Runs once per database file.
+        schema_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if schema_version < 1:
+            cursor.execute('''
+                UPDATE interactions
+                SET timestamp = CAST(ROUND((julianday(timestamp, 'utc') - 2440587.5) * 86400000) AS INTEGER)
+                WHERE typeof(timestamp) = 'text'
+            ''')
+        if schema_version < _SCHEMA_VERSION:
+            cursor.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+        
+        # Indexes for the time-range scans in trend analysis, anomaly detection and
+        # training export; the partial indexes only cover errored / exportable rows
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_interactions_ts ON interactions(timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_interactions_user_ts ON interactions(user_id, timestamp)")
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_interactions_errors ON interactions(timestamp)
+            WHERE error_details IS NOT NULL
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_interactions_feedback ON interactions(timestamp)
+            WHERE user_feedback IS NOT NULL AND error_details IS NULL
+        ''')
         
         print("✅ LAW Matrix v4.0 - Observability database initialized")
         
+    def flush(self):
+        """Write all buffered interaction rows and feedback updates in a single transaction"""
+        
+        with self._db_lock:
+            self._last_flush = time.monotonic()
+            if not self._pending_rows and not self._pending_feedback:
+                return
+                
+            rows, self._pending_rows = self._pending_rows, []
+            feedback, self._pending_feedback = self._pending_feedback, []
+            cursor = self._conn.cursor()
+            
+            cursor.execute("BEGIN")
+            try:
+                # Inserts first so feedback can target interactions from the same batch
+                cursor.executemany(self._INSERT_SQL, rows)
+                cursor.executemany(self._FEEDBACK_UPDATE_SQL, feedback)
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                self._pending_rows[:0] = rows
+                self._pending_feedback[:0] = feedback
+                raise
+                
+    def _maybe_flush(self):
+        """Flush buffered rows once the batch is full or the flush interval has elapsed"""
+        
+        with self._db_lock:
+            if (len(self._pending_rows) + len(self._pending_feedback) >= self.flush_batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+                
+    def maintenance(self, vacuum: bool = False):
+        """Checkpoint the WAL and refresh planner statistics; intended to run nightly"""
+        
+        with self._db_lock:
+            self.flush()
+            cursor = self._conn.cursor()
+            cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            cursor.execute("ANALYZE")
+            cursor.execute("PRAGMA optimize")
+            
+            # Reclaims free pages but rewrites the whole file, so it is opt-in
+            if vacuum:
+                cursor.execute("VACUUM")
+                
+        print("✅ LAW Matrix v4.0 - Observability database maintenance complete")
+        
+    def close(self):
+        """Flush buffered writes, run maintenance and close the shared database connection"""
+        
+        with self._db_lock:
+            self.maintenance()  # flushes first
+            atexit.unregister(self.flush)
+            self._conn.close()
+            
     def log_interaction(self, interaction: InteractionLog):
         """Log a user interaction for analysis"""
         
+        self._buffer_interaction(interaction)
+        self._maybe_flush()
+        
+    def log_interactions(self, interactions: List[InteractionLog]):
+        """Log several interactions in a single transaction"""
+        
+        with self._db_lock:
+            for interaction in interactions:
+                self._buffer_interaction(interaction)
+            self.flush()
+            
+    def _buffer_interaction(self, interaction: InteractionLog):
+        """Buffer an interaction row for the next flush and update in-memory metrics"""
+        
         # Generate unique ID if not provided
         if not interaction.id:
             interaction.id = self._generate_interaction_id(interaction)
             
-        # Store in database
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO interactions 
-            (id, user_id, session_id, timestamp, interaction_type, input_data, output_data,
-             processing_time_ms, tokens_used, model_version, context_data, quality_scores,
-             user_feedback, error_details)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            interaction.id,
-            interaction.user_id,
-            interaction.session_id,
-            interaction.timestamp.isoformat(),
-            interaction.interaction_type.value,
-            json.dumps(interaction.input_data),
-            json.dumps(interaction.output_data),
-            interaction.processing_time_ms,
-            interaction.tokens_used,
-            interaction.model_version,
-            json.dumps(interaction.context_data),
-            json.dumps(interaction.quality_scores),
-            json.dumps(interaction.user_feedback) if interaction.user_feedback else None,
-            interaction.error_details
-        ))
-        
-        conn.commit()
-        conn.close()
+        (interaction_id, user_id, session_id, timestamp, interaction_type, input_data, output_data,
+         processing_time_ms, tokens_used, model_version, context_data, quality_scores,
+         user_feedback, error_details) = _interaction_fields(interaction)
+        interaction_type = _INTERACTION_TYPE_VALUES[interaction_type]
+        
+        # Buffer for the next batched database write
+        with self._db_lock:
+            self._pending_rows.append((
+                interaction_id,
+                user_id,
+                session_id,
+                _epoch_ms(timestamp),
+                interaction_type,
+                _dumps(input_data),
+                _dumps(output_data),
+                processing_time_ms,
+                tokens_used,
+                model_version,
+                _dumps(context_data),
+                _dumps(quality_scores),
+                _dumps(user_feedback) if user_feedback else None,
+                error_details
+            ))
         
         # Update in-memory metrics
         self._update_session_metrics(interaction)
         self._update_user_patterns(interaction)
         
         # Log to structured log
-        self.logger.info(json.dumps({
-            'interaction_id': interaction.id,
-            'user_id': interaction.user_id,
-            'type': interaction.interaction_type.value,
-            'processing_time': interaction.processing_time_ms,
-            'tokens_used': interaction.tokens_used,
-            'quality_scores': interaction.quality_scores
+        self.logger.info(_dumps({
+            'interaction_id': interaction_id,
+            'user_id': user_id,
+            'type': interaction_type,
+            'processing_time': processing_time_ms,
+            'tokens_used': tokens_used,
+            'quality_scores': quality_scores
         }))
         
     def _generate_interaction_id(self, interaction: InteractionLog) -> str:
-        """Generate unique interaction ID"""
-        
-        content = f"{interaction.user_id}_{interaction.session_id}_{interaction.timestamp}_{interaction.interaction_type.value}"
-        return hashlib.md5(content.encode()).hexdigest()
+        """Generate unique interaction ID (UUIDv7 as 32 hex chars)"""
+        
+        # 48-bit millisecond timestamp first, so IDs sort by creation time and
+        # primary key inserts append to the end of the B-tree
+        unix_ms = time.time_ns() // 1_000_000
+        rand = int.from_bytes(os.urandom(10), 'big')
+        value = (
+            (unix_ms & 0xFFFF_FFFF_FFFF) << 80
+            | 0x7 << 76                              # version 7
+            | (rand >> 68) << 64                     # rand_a, 12 bits
+            | 0b10 << 62                             # RFC 4122 variant
+            | rand & 0x3FFF_FFFF_FFFF_FFFF           # rand_b, 62 bits
+        )
+        return f"{value:032x}"
         
     def _update_session_metrics(self, interaction: InteractionLog):
         """Update session-level metrics"""
         
         session_key = f"{interaction.user_id}_{interaction.session_id}"
-        self.session_metrics[session_key].append(interaction)
-        
-        # Keep only recent interactions (last 100)
-        if len(self.session_metrics[session_key]) > 100:
-            self.session_metrics[session_key] = self.session_metrics[session_key][-100:]
+        self._recent_window(self.session_metrics, session_key, self.session_window).append(interaction)
             
     def _update_user_patterns(self, interaction: InteractionLog):
         """Update user behavior patterns"""
         
-        self.user_patterns[interaction.user_id].append(interaction)
-        
-        # Keep only recent interactions (last 1000)
-        if len(self.user_patterns[interaction.user_id]) > 1000:
-            self.user_patterns[interaction.user_id] = self.user_patterns[interaction.user_id][-1000:]
+        self._recent_window(self.user_patterns, interaction.user_id, self.user_window).append(interaction)
+            
+    def _recent_window(self, store: OrderedDict, key: str, maxlen: int) -> deque:
+        """Return the bounded window for key, evicting the least recently used keys"""
+        
+        window = store.get(key)
+        if window is None:
+            window = store[key] = deque(maxlen=maxlen)
+            while len(store) > self.max_tracked_keys:
+                store.popitem(last=False)
+        else:
+            store.move_to_end(key)
+        return window
             
     def analyze_performance_trends(self, days: int = 7) -> Dict[str, Any]:
         """Analyze performance trends over specified period"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         # Get interactions from last N days
-        cutoff_date = datetime.now() - timedelta(days=days)
-        cursor.execute('''
-            SELECT * FROM interactions 
-            WHERE timestamp >= ? 
-            ORDER BY timestamp DESC
-        ''', (cutoff_date.isoformat(),))
+        cutoff = _epoch_ms(datetime.now() - timedelta(days=days))
         
-        interactions = cursor.fetchall()
-        conn.close()
-        
-        if not interactions:
-            return {'error': 'No data available for analysis'}
+        with self._db_lock:
+            # Make buffered interactions visible before reading them back
+            self.flush()
+            cursor = self._conn.cursor()
+            
+            # Aggregate in SQLite so only summary rows come back
+            cursor.execute('''
+                SELECT COUNT(*),
+                       COUNT(NULLIF(error_details, '')),
+                       AVG(CASE WHEN processing_time_ms > 0 THEN processing_time_ms END),
+                       AVG(tokens_used),
+                       AVG(CASE WHEN user_feedback != '' THEN json_extract(user_feedback, '$.satisfaction_score') END)
+                FROM interactions 
+                WHERE timestamp >= ?
+            ''', (cutoff,))
+            total_interactions, error_count, avg_response_time, avg_tokens, avg_satisfaction = cursor.fetchone()
+            
+            if not total_interactions:
+                return {'error': 'No data available for analysis'}
+                
+            # Calculate quality scores, per metric key across all score objects
+            cursor.execute('''
+                SELECT score.key, AVG(score.value)
+                FROM interactions, json_each(interactions.quality_scores) AS score
+                WHERE interactions.timestamp >= ? AND interactions.quality_scores != ''
+                GROUP BY score.key
+            ''', (cutoff,))
+            avg_quality = dict(cursor.fetchall())
+            
+            trend_analysis = self._analyze_trends(cursor, cutoff)
             
-        # Calculate metrics
-        total_interactions = len(interactions)
-        error_count = sum(1 for i in interactions if i[13])  # error_details column
-        
-        response_times = [i[7] for i in interactions if i[7] > 0]  # processing_time_ms
-        avg_response_time = np.mean(response_times) if response_times else 0
-        
-        tokens_used = [i[8] for i in interactions]  # tokens_used
-        avg_tokens = np.mean(tokens_used) if tokens_used else 0
-        
-        # Calculate quality scores
-        quality_scores = defaultdict(list)
-        for interaction in interactions:
-            if interaction[11]:  # quality_scores column
-                scores = json.loads(interaction[11])
-                for metric, score in scores.items():
-                    quality_scores[metric].append(score)
-                    
-        avg_quality = {metric: np.mean(scores) for metric, scores in quality_scores.items()}
-        
-        # User satisfaction (from feedback)
-        satisfaction_scores = []
-        for interaction in interactions:
-            if interaction[12]:  # user_feedback column
-                feedback = json.loads(interaction[12])
-                if 'satisfaction_score' in feedback:
-                    satisfaction_scores.append(feedback['satisfaction_score'])
-                    
-        avg_satisfaction = np.mean(satisfaction_scores) if satisfaction_scores else 0
-        
         return {
             'period_days': days,
             'total_interactions': total_interactions,
-            'error_rate': (error_count / total_interactions) * 100 if total_interactions > 0 else 0,
-            'average_response_time_ms': avg_response_time,
-            'average_tokens_per_interaction': avg_tokens,
+            'error_rate': (error_count / total_interactions) * 100,
+            'average_response_time_ms': avg_response_time or 0,
+            'average_tokens_per_interaction': avg_tokens or 0,
             'average_quality_scores': avg_quality,
-            'user_satisfaction_score': avg_satisfaction,
-            'trend_analysis': self._analyze_trends(interactions)
+            'user_satisfaction_score': avg_satisfaction or 0,
+            'trend_analysis': trend_analysis
         }
         
-    def _analyze_trends(self, interactions: List[Tuple]) -> Dict[str, Any]:
+    def _analyze_trends(self, cursor: sqlite3.Cursor, cutoff: int) -> Dict[str, Any]:
         """Analyze trends in interaction data"""
         
-        # Group by day
-        daily_metrics = defaultdict(list)
-        for interaction in interactions:
-            date = datetime.fromisoformat(interaction[3]).date()
-            daily_metrics[date].append(interaction)
-            
-        # Calculate daily averages
-        daily_trends = {}
-        for date, day_interactions in daily_metrics.items():
-            response_times = [i[7] for i in day_interactions if i[7] > 0]
-            daily_trends[date.isoformat()] = {
-                'interaction_count': len(day_interactions),
-                'avg_response_time': np.mean(response_times) if response_times else 0,
-                'error_count': sum(1 for i in day_interactions if i[13])
+        # Group by local calendar day, most recent first - 'localtime' applies each
+        # row's own UTC offset, so days on either side of a DST change line up
+        cursor.execute('''
+            SELECT date(timestamp / 1000, 'unixepoch', 'localtime') AS day,
+                   COUNT(*),
+                   AVG(CASE WHEN processing_time_ms > 0 THEN processing_time_ms END),
+                   COUNT(NULLIF(error_details, ''))
+            FROM interactions 
+            WHERE timestamp >= ?
+            GROUP BY day
+            ORDER BY day DESC
+        ''', (cutoff,))
+        
+        return {
+            day: {
+                'interaction_count': interaction_count,
+                'avg_response_time': avg_response_time or 0,
+                'error_count': error_count
             }
-            
-        return daily_trends
+            for day, interaction_count, avg_response_time, error_count in cursor
+        }
         
     def detect_anomalies(self) -> List[Dict[str, Any]]:
         """Detect anomalous behavior patterns"""
         
         anomalies = []
         
-        # Analyze recent interactions
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM interactions 
-            WHERE timestamp >= datetime('now', '-1 day')
-            ORDER BY timestamp DESC
-        ''')
-        
-        recent_interactions = cursor.fetchall()
-        conn.close()
-        
+        # Analyze recent interactions - only the columns the checks need
+        with self._db_lock:
+            # Make buffered interactions visible before reading them back
+            self.flush()
+            cursor = self._conn.cursor()
+            cursor.arraysize = 1000
+            
+            cursor.execute('''
+                SELECT id, processing_time_ms, COALESCE(error_details, '') != ''
+                FROM interactions 
+                WHERE timestamp >= ?
+                ORDER BY timestamp DESC
+            ''', (_epoch_ms(datetime.now()) - _DAY_MS,))
+            
+            recent_interactions = cursor.fetchall()
+            
         if len(recent_interactions) < 10:
             return anomalies
             
+        # Columnar arrays so the statistics and threshold checks run in NumPy
+        interaction_ids, response_times, error_flags = zip(*recent_interactions)
+        response_times = np.fromiter(response_times, dtype=np.float64, count=len(recent_interactions))
+        error_flags = np.fromiter(error_flags, dtype=np.bool_, count=len(recent_interactions))
+        
         # Check for response time anomalies
-        response_times = [i[7] for i in recent_interactions if i[7] > 0]
-        if response_times:
-            avg_response_time = np.mean(response_times)
-            std_response_time = np.std(response_times)
+        positive_times = response_times[response_times > 0]
+        if positive_times.size:
+            threshold = float(positive_times.mean() + 3 * positive_times.std())
             
-            for interaction in recent_interactions:
-                if interaction[7] > avg_response_time + (3 * std_response_time):
-                    anomalies.append({
-                        'type': 'high_response_time',
-                        'interaction_id': interaction[0],
-                        'value': interaction[7],
-                        'threshold': avg_response_time + (3 * std_response_time),
-                        'severity': 'high'
-                    })
-                    
+            for index in np.flatnonzero(response_times > threshold):
+                anomalies.append({
+                    'type': 'high_response_time',
+                    'interaction_id': interaction_ids[index],
+                    'value': float(response_times[index]),
+                    'threshold': threshold,
+                    'severity': 'high'
+                })
+                
         # Check for error rate spikes
-        error_count = sum(1 for i in recent_interactions if i[13])
-        error_rate = (error_count / len(recent_interactions)) * 100
+        error_rate = (int(error_flags.sum()) / len(recent_interactions)) * 100
         
         if error_rate > 10:  # More than 10% error rate
             anomalies.append({
@@ -430,43 +620,44 @@ class LawMatrixObservabilitySystem:
     def export_training_data(self, output_file: str = "lawmatrix_training_data.jsonl"):
         """Export high-quality interactions for fine-tuning"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Get high-quality interactions (good user feedback, no errors)
-        cursor.execute('''
-            SELECT * FROM interactions 
-            WHERE error_details IS NULL 
-            AND user_feedback IS NOT NULL
-            AND json_extract(user_feedback, '$.satisfaction_score') >= 4
-            ORDER BY timestamp DESC
-        ''')
+        # Make buffered interactions visible, then stream from a separate reader
+        # connection - WAL readers don't block logging on the shared connection
+        self.flush()
+        conn = self._connect()
+        exported = 0
         
-        interactions = cursor.fetchall()
-        conn.close()
-        
-        # Format for training
-        training_data = []
-        for interaction in interactions:
-            if interaction[12]:  # user_feedback
-                feedback = json.loads(interaction[12])
-                if feedback.get('satisfaction_score', 0) >= 4:
-                    training_data.append({
-                        'instruction': interaction[5],  # input_data
-                        'response': interaction[6],    # output_data
-                        'context': interaction[10],    # context_data
-                        'quality_scores': interaction[11],  # quality_scores
-                        'timestamp': interaction[3]
-                    })
-                    
-        # Write to JSONL file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            for item in training_data:
-                f.write(json.dumps(item) + '\n')
-                
-        print(f"✅ LAW Matrix v4.0 - Exported {len(training_data)} high-quality interactions to {output_file}")
+        try:
+            cursor = conn.cursor()
+            cursor.arraysize = 500
+            
+            # Get high-quality interactions (good user feedback, no errors)
+            cursor.execute('''
+                SELECT input_data, output_data, context_data, quality_scores, timestamp
+                FROM interactions 
+                WHERE error_details IS NULL 
+                AND user_feedback IS NOT NULL
+                AND json_extract(user_feedback, '$.satisfaction_score') >= 4
+                ORDER BY timestamp DESC
+            ''')
+            
+            # Format for training and write to JSONL file row by row - the query
+            # already applies the satisfaction filter, so rows are written as-is
+            with open(output_file, 'wb') as f:
+                for input_data, output_data, context_data, quality_scores, timestamp in cursor:
+                    f.write(orjson.dumps({
+                        'instruction': input_data,
+                        'response': output_data,
+                        'context': context_data,
+                        'quality_scores': quality_scores,
+                        'timestamp': datetime.fromtimestamp(timestamp / 1000).isoformat()
+                    }, option=orjson.OPT_APPEND_NEWLINE))
+                    exported += 1
+        finally:
+            conn.close()
+            
+        print(f"✅ LAW Matrix v4.0 - Exported {exported} high-quality interactions to {output_file}")
         
-        return len(training_data)
+        return exported
 
 class LawMatrixFeedbackCollector:
     """
@@ -479,57 +670,65 @@ class LawMatrixFeedbackCollector:
     def collect_feedback(self, interaction_id: str, feedback_data: Dict[str, Any]):
         """Collect user feedback for an interaction"""
         
-        # Update interaction with feedback
-        conn = sqlite3.connect(self.observability.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE interactions 
-            SET user_feedback = ? 
-            WHERE id = ?
-        ''', (json.dumps(feedback_data), interaction_id))
-        
-        conn.commit()
-        conn.close()
+        # Buffer the update; it is written with the next batched flush
+        with self.observability._db_lock:
+            self.observability._pending_feedback.append((_dumps(feedback_data), interaction_id))
+            self.observability._maybe_flush()
         
         print(f"✅ LAW Matrix v4.0 - Feedback collected for interaction {interaction_id}")
         
-    def analyze_feedback_patterns(self) -> Dict[str, Any]:
-        """Analyze patterns in user feedback"""
+    def collect_feedback_batch(self, items: List[Tuple[str, Dict[str, Any]]]):
+        """Collect feedback for several interactions in a single transaction"""
         
-        conn = sqlite3.connect(self.observability.db_path)
-        cursor = conn.cursor()
+        with self.observability._db_lock:
+            self.observability._pending_feedback.extend(
+                (_dumps(feedback_data), interaction_id) for interaction_id, feedback_data in items
+            )
+            self.observability.flush()
         
-        cursor.execute('''
-            SELECT user_feedback FROM interactions 
-            WHERE user_feedback IS NOT NULL
-        ''')
+        print(f"✅ LAW Matrix v4.0 - Feedback collected for {len(items)} interactions")
         
-        feedback_data = cursor.fetchall()
-        conn.close()
+    def analyze_feedback_patterns(self) -> Dict[str, Any]:
+        """Analyze patterns in user feedback"""
         
-        if not feedback_data:
-            return {'error': 'No feedback data available'}
+        with self.observability._db_lock:
+            self.observability.flush()
+            cursor = self.observability._conn.cursor()
             
-        # Analyze feedback patterns
-        satisfaction_scores = []
-        common_issues = Counter()
-        
-        for feedback_row in feedback_data:
-            feedback = json.loads(feedback_row[0])
+            # Analyze feedback patterns in SQLite - JSON1 unpacks the feedback objects
+            cursor.execute('''
+                SELECT COUNT(*), AVG(json_extract(user_feedback, '$.satisfaction_score'))
+                FROM interactions 
+                WHERE user_feedback IS NOT NULL
+            ''')
+            total_feedback, average_satisfaction = cursor.fetchone()
             
-            if 'satisfaction_score' in feedback:
-                satisfaction_scores.append(feedback['satisfaction_score'])
+            if not total_feedback:
+                return {'error': 'No feedback data available'}
                 
-            if 'issues' in feedback:
-                for issue in feedback['issues']:
-                    common_issues[issue] += 1
-                    
+            cursor.execute('''
+                SELECT issue.value, COUNT(*) AS occurrences
+                FROM interactions, json_each(interactions.user_feedback, '$.issues') AS issue
+                WHERE interactions.user_feedback IS NOT NULL
+                GROUP BY issue.value
+                ORDER BY occurrences DESC
+                LIMIT 10
+            ''')
+            common_issues = dict(cursor.fetchall())
+            
+            cursor.execute('''
+                SELECT json_extract(user_feedback, '$.satisfaction_score') AS score, COUNT(*)
+                FROM interactions 
+                WHERE user_feedback IS NOT NULL AND score IS NOT NULL
+                GROUP BY score
+            ''')
+            satisfaction_distribution = Counter(dict(cursor.fetchall()))
+            
         return {
-            'average_satisfaction': np.mean(satisfaction_scores) if satisfaction_scores else 0,
-            'total_feedback_responses': len(feedback_data),
-            'common_issues': dict(common_issues.most_common(10)),
-            'satisfaction_distribution': Counter(satisfaction_scores)
+            'average_satisfaction': average_satisfaction or 0,
+            'total_feedback_responses': total_feedback,
+            'common_issues': common_issues,
+            'satisfaction_distribution': satisfaction_distribution
         }
 
 if __name__ == "__main__":
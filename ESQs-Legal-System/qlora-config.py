@@ -11,13 +11,29 @@ from transformers import (
     BitsAndBytesConfig,
     TrainingArguments,
     Trainer,
-    DataCollatorForLanguageModeling
+    DataCollatorForLanguageModeling,
+    DataCollatorWithFlattening
 )
-from peft import LoraConfig, get_peft_model, TaskType, PeftModel
-from datasets import Dataset
+from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training, TaskType, PeftModel
+from datasets import Dataset, load_from_disk
+import hashlib
+import importlib.util
 import json
 import os
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Literal, Optional
+
+QuantMode = Literal["bf16", "int8", "nf4"]
+
+# Below this many rows, tokenizing in-process beats spinning up a worker pool
+_PARALLEL_TOKENIZE_MIN_ROWS = 10_000
+
+# FlashAttention-2's varlen kernels are what make packed (flattened) batches attend per example;
+# the package alone is not enough, the kernels only run on Ampere (compute capability 8.x) or newer
+FLASH_ATTENTION_AVAILABLE = (
+    importlib.util.find_spec("flash_attn") is not None
+    and torch.cuda.is_available()
+    and torch.cuda.get_device_capability()[0] >= 8
+)
 
 class LawMatrixQLoRAConfig:
     """
@@ -25,38 +41,78 @@ class LawMatrixQLoRAConfig:
     Implements memory-efficient adaptation for legal AI specialization
     """
     
-    def __init__(self):
+    def __init__(self, quant_mode: Optional[QuantMode] = None):
         # Base model configuration - using Llama-2-7B for legal reasoning
         self.base_model_name = "meta-llama/Llama-2-7b-chat-hf"
+        self.model_params_billions = 7.0
+        
+        # Weight precision - picked from free GPU memory unless given explicitly
+        self.quant_mode = quant_mode or self._select_quant_mode()
+        
+        # Compute precision - bf16 needs Ampere or newer; older GPUs fall back to fp16, as before bf16 was adopted
+        self.use_bf16 = torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+        self.torch_dtype = torch.bfloat16 if self.use_bf16 else torch.float16
+        
+        # Per-device loading budget, so shards stream straight to the GPUs instead of
+        # materializing the full state dict in host RAM first
+        self.max_memory = self._default_max_memory()
+        
+        # Attention kernel - packing examples into one sequence needs FlashAttention-2
+        self.attn_implementation = "flash_attention_2" if FLASH_ATTENTION_AVAILABLE else "sdpa"
+        self.pack_sequences = FLASH_ATTENTION_AVAILABLE
+        
+        # torch.compile fuses the dequantize + matmul path, but needs static shapes: packed
+        # batches change length every step, so it only applies to padded batches, and
+        # pre-Ampere GPUs regress under max-autotune
+        self.compile_model = (
+            not self.pack_sequences
+            and torch.cuda.is_available()
+            and torch.cuda.get_device_capability()[0] >= 8
+        )
+        self.pad_to_multiple_of = 256  # bounds the number of distinct compiled shapes
         
-        # QLoRA Configuration
+        # QLoRA Configuration - attention query/value projections only; for a
+        # single-jurisdiction SFT set this matches full projection coverage at a
+        # fraction of the trainable parameters. Add k_proj/o_proj back if a
+        # held-out legal eval regresses.
         self.lora_config = LoraConfig(
             task_type=TaskType.CAUSAL_LM,
             inference_mode=False,
             r=16,  # Rank of adaptation
             lora_alpha=32,  # LoRA scaling parameter
             lora_dropout=0.1,
-            target_modules=["q_proj", "v_proj", "k_proj", "o_proj", "gate_proj", "up_proj", "down_proj"]
+            target_modules=["q_proj", "v_proj"],
+            use_rslora=True,  # rank-stabilized scaling (alpha / sqrt(r))
+            bias="none"
         )
         
-        # 4-bit quantization configuration
-        self.quantization_config = BitsAndBytesConfig(
-            load_in_4bit=True,
-            bnb_4bit_use_double_quant=True,
-            bnb_4bit_quant_type="nf4",
-            bnb_4bit_compute_dtype=torch.bfloat16
-        )
+        # Quantization configuration - none for bf16 LoRA
+        if self.quant_mode == "nf4":
+            self.quantization_config = BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_use_double_quant=True,
+                bnb_4bit_quant_type="nf4",
+                bnb_4bit_compute_dtype=self.torch_dtype
+            )
+        elif self.quant_mode == "int8":
+            self.quantization_config = BitsAndBytesConfig(load_in_8bit=True)
+        else:
+            self.quantization_config = None
         
         # Training arguments
         self.training_args = TrainingArguments(
             output_dir="./lawmatrix-lora-adapters",
             num_train_epochs=3,
-            per_device_train_batch_size=1,
+            per_device_train_batch_size=4,  # real batch instead of accumulation, affordable with checkpointing
             per_device_eval_batch_size=1,
-            gradient_accumulation_steps=4,
+            gradient_accumulation_steps=1,
             warmup_steps=100,
             learning_rate=2e-4,
-            fp16=True,
+            bf16=self.use_bf16,  # matches bnb_4bit_compute_dtype
+            fp16=torch.cuda.is_available() and not self.use_bf16,
+            gradient_checkpointing=True,
+            gradient_checkpointing_kwargs={"use_reentrant": False},
+            optim="paged_adamw_8bit",  # paged 8-bit optimizer states, per the QLoRA recipe
             logging_steps=10,
             save_steps=500,
             eval_steps=500,
@@ -65,7 +121,49 @@ class LawMatrixQLoRAConfig:
             load_best_model_at_end=True,
             report_to="none",  # Disable wandb for now
             remove_unused_columns=False,
+            # Trainer compiles after its quantized-model checks; a pre-compiled PEFT model is rejected
+            torch_compile=self.compile_model,
+            torch_compile_mode="max-autotune-no-cudagraphs",
         )
+        
+    @staticmethod
+    def _default_max_memory() -> Optional[Dict[Any, str]]:
+        """Leave ~10% of each GPU for activations and cap host RAM used for offload"""
+        
+        if not torch.cuda.is_available():
+            return None
+            
+        max_memory = {
+            device: f"{int(torch.cuda.get_device_properties(device).total_memory * 0.9 / 2**30)}GiB"
+            for device in range(torch.cuda.device_count())
+        }
+        max_memory["cpu"] = "8GiB"
+        return max_memory
+        
+    def _select_quant_mode(self) -> QuantMode:
+        """
+        Pick the fastest weight precision that fits in free GPU memory
+        
+        NF4 dequantization costs throughput: on models up to a few billion
+        parameters it is markedly slower than bf16, and it only pays off when
+        memory is the constraint - roughly 7B+ models on a single GPU. int8
+        has cheaper dequantization, so it is preferred over NF4 when it fits.
+        """
+        
+        if not torch.cuda.is_available():
+            return "nf4"
+            
+        free_bytes, _ = torch.cuda.mem_get_info()
+        
+        # Weights plus ~30% headroom for activations, LoRA weights and optimizer state
+        def fits(bytes_per_param: float) -> bool:
+            return self.model_params_billions * 1e9 * bytes_per_param * 1.3 <= free_bytes
+            
+        if fits(2):
+            return "bf16"
+        if fits(1):
+            return "int8"
+        return "nf4"
 
 class LawMatrixDataProcessor:
     """
@@ -109,19 +207,51 @@ class LawMatrixDataProcessor:
             
         return Dataset.from_list(formatted_data)
     
-    def tokenize_dataset(self, dataset: Dataset) -> Dataset:
-        """Tokenizes the dataset for training"""
+    def tokenize_dataset(self, dataset: Dataset, cache_dir: Optional[str] = "./lawmatrix-tokenized") -> Dataset:
+        """Tokenizes the dataset for training, reusing the memory-mapped copy from an earlier run"""
         
+        cache_path = None
+        if cache_dir:
+            cache_path = os.path.join(cache_dir, self._tokenization_fingerprint(dataset))
+            if os.path.isdir(cache_path):
+                return load_from_disk(cache_path)
+                
+        # Plain token id lists - Arrow stores them as int columns and the
+        # collator builds the tensors, so no per-batch torch allocation here
         def tokenize_function(examples):
             return self.tokenizer(
                 examples["text"],
                 truncation=True,
                 padding=False,
-                max_length=self.max_length,
-                return_tensors="pt"
+                max_length=self.max_length
             )
             
-        return dataset.map(tokenize_function, batched=True, remove_columns=dataset.column_names)
+        # Worker processes only pay for their startup and tokenizer pickling on large datasets
+        num_proc = None
+        if len(dataset) >= _PARALLEL_TOKENIZE_MIN_ROWS:
+            num_proc = min(os.cpu_count() or 1, len(dataset))
+            
+        tokenized_dataset = dataset.map(
+            tokenize_function,
+            batched=True,
+            num_proc=num_proc,
+            remove_columns=dataset.column_names
+        )
+        
+        if cache_path:
+            tokenized_dataset.save_to_disk(cache_path)
+            
+        return tokenized_dataset
+        
+    def _tokenization_fingerprint(self, dataset: Dataset) -> str:
+        """Hash of the tokenizer, length limit and texts - changes whenever the instructions do"""
+        
+        hasher = hashlib.sha256()
+        hasher.update(json.dumps([self.tokenizer.name_or_path, self.max_length]).encode())
+        for text in dataset["text"]:
+            hasher.update(text.encode())
+            hasher.update(b"\0")
+        return hasher.hexdigest()[:16]
 
 class LawMatrixFineTuner:
     """
@@ -129,8 +259,8 @@ class LawMatrixFineTuner:
     Implements the complete QLoRA training pipeline
     """
     
-    def __init__(self):
-        self.config = LawMatrixQLoRAConfig()
+    def __init__(self, quant_mode: Optional[QuantMode] = None):
+        self.config = LawMatrixQLoRAConfig(quant_mode)
         self.tokenizer = None
         self.model = None
         self.peft_model = None
@@ -138,7 +268,7 @@ class LawMatrixFineTuner:
     def setup_model_and_tokenizer(self):
         """Initialize model and tokenizer with QLoRA configuration"""
         
-        print("🚀 LAW Matrix v4.0 - Initializing QLoRA Fine-Tuning...")
+        print(f"🚀 LAW Matrix v4.0 - Initializing QLoRA Fine-Tuning ({self.config.quant_mode} weights)...")
         
         # Load tokenizer
         self.tokenizer = AutoTokenizer.from_pretrained(
@@ -152,10 +282,18 @@ class LawMatrixFineTuner:
         self.model = AutoModelForCausalLM.from_pretrained(
             self.config.base_model_name,
             quantization_config=self.config.quantization_config,
+            torch_dtype=self.config.torch_dtype,
+            attn_implementation=self.config.attn_implementation,
             device_map="auto",
+            max_memory=self.config.max_memory,
+            low_cpu_mem_usage=True,
             trust_remote_code=True
         )
         
+        # Prepare a quantized model for training (norms in FP32, input grads for checkpointing)
+        if self.config.quantization_config is not None:
+            self.model = prepare_model_for_kbit_training(self.model, use_gradient_checkpointing=True)
+        
         # Apply LoRA
         self.peft_model = get_peft_model(self.model, self.config.lora_config)
         self.peft_model.print_trainable_parameters()
@@ -172,13 +310,18 @@ class LawMatrixFineTuner:
         dataset = processor.create_legal_instruction_dataset()
         tokenized_dataset = processor.tokenize_dataset(dataset)
         
-        # Data collator
-        data_collator = DataCollatorForLanguageModeling(
-            tokenizer=self.tokenizer,
-            mlm=False
-        )
-        
-        # Initialize trainer
+        # Data collator - pack examples into one flat sequence with per-example
+        # position_ids instead of padding every example to the batch maximum
+        if self.config.pack_sequences:
+            data_collator = DataCollatorWithFlattening()
+        else:
+            data_collator = DataCollatorForLanguageModeling(
+                tokenizer=self.tokenizer,
+                mlm=False,
+                pad_to_multiple_of=self.config.pad_to_multiple_of if self.config.compile_model else None
+            )
+            
+        # Initialize trainer (compiles the model itself when compile_model is set)
         trainer = Trainer(
             model=self.peft_model,
             args=self.config.training_args,
@@ -190,7 +333,7 @@ class LawMatrixFineTuner:
         trainer.train()
         
         # Save the adapter
-        trainer.model.save_pretrained("./lawmatrix-lora-adapters")
+        self.peft_model.save_pretrained("./lawmatrix-lora-adapters")
         self.tokenizer.save_pretrained("./lawmatrix-lora-adapters")
         
         print("✅ LAW Matrix v4.0 - Fine-tuning complete!")
@@ -202,17 +345,36 @@ class LawMatrixFineTuner:
         self.model = AutoModelForCausalLM.from_pretrained(
             self.config.base_model_name,
             quantization_config=self.config.quantization_config,
+            torch_dtype=self.config.torch_dtype,
+            attn_implementation=self.config.attn_implementation,
             device_map="auto",
+            max_memory=self.config.max_memory,
+            low_cpu_mem_usage=True,
             trust_remote_code=True
         )
         
         # Load LoRA adapter
         self.peft_model = PeftModel.from_pretrained(self.model, adapter_path)
         
-        # Load tokenizer
-        self.tokenizer = AutoTokenizer.from_pretrained(adapter_path)
+        # Load tokenizer - left padding, so batched generation continues every prompt from its last token
+        self.tokenizer = AutoTokenizer.from_pretrained(adapter_path, padding_side="left")
         
         print("✅ LAW Matrix v4.0 - Fine-tuned model loaded!")
+        
+    def generate(self, prompts: List[str], max_new_tokens: int = 512) -> List[str]:
+        """Generate responses for a batch of prompts with a single padded generate call"""
+        
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True).to(self.peft_model.device)
+        
+        with torch.inference_mode():
+            outputs = self.peft_model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                pad_token_id=self.tokenizer.pad_token_id
+            )
+            
+        # Prompts are left-padded to a common length, so the completions start at the same column
+        return self.tokenizer.batch_decode(outputs[:, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
 
 if __name__ == "__main__":
     # Initialize and run fine-tuning
@@ -5,17 +5,29 @@ Contextual intelligence and observation for observant legal AI
 """
 
 import os
+import re
 import json
 import numpy as np
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from dataclasses import dataclass, field
 from datetime import datetime
 import sqlite3
+import threading
+import torch
+from collections import OrderedDict
+from operator import itemgetter
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import faiss
 
-@dataclass
+# Precise legal references - statutory citations and quoted phrases - where lexical
+# matching beats semantic search and narrows the candidate set
+_CITATION_PATTERN = re.compile(r'§+\s*(\d+(?:-\d+)+)')
+_QUOTED_PHRASE_PATTERN = re.compile(r'"([^"]+)"')
+
+# Cosine-similarity bonus for documents that contain a cited statute or quoted phrase
+_LEXICAL_MATCH_BOOST = 0.1
+
+@dataclass(slots=True)
 class LegalDocument:
     """Represents a legal document in the knowledge base"""
     id: str
@@ -27,7 +39,7 @@ class LegalDocument:
     tags: List[str]
     metadata: Dict[str, Any]
 
-@dataclass
+@dataclass(slots=True)
 class UserContext:
     """Represents current user context and activity"""
     user_id: str
@@ -36,6 +48,11 @@ class UserContext:
     recent_queries: List[str]
     user_preferences: Dict[str, Any]
     session_data: Dict[str, Any]
+    _preferred_doc_types: frozenset = field(default=frozenset(), init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        # Set once when the context is materialized, so ranking does O(1) membership checks
+        self._preferred_doc_types = frozenset(self.user_preferences.get('preferred_doc_types', []))
 
 class LawMatrixRAGSystem:
     """
@@ -43,22 +60,77 @@ class LawMatrixRAGSystem:
     Provides contextual intelligence through real-time data retrieval
     """
     
+    # Constant statement text, so the connection's statement cache reuses the prepared INSERT
+    _INSERT_SQL = '''
+        INSERT OR REPLACE INTO legal_documents 
+        (id, title, content, document_type, jurisdiction, tags, metadata, embedding)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    
     def __init__(self, db_path: str = "lawmatrix_knowledge.db"):
         self.db_path = db_path
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2', device=self.device)
+        if self.device == 'cuda':
+            self._enable_half_precision()
         self.index = None
-        self.document_store = {}
+        self.index_path = f"{db_path}.faiss"
+        self._id_by_row: List[str] = []  # FAISS row id -> document id
+        self._meta_by_id: Dict[str, Dict[str, Any]] = {}  # document id -> parsed metadata, without content
+        self._index_dirty = False  # in-memory index has additions not yet written to disk
         self.vector_dimension = 384
         
+        # HNSW graph parameters - neighbours per node, build and query beam widths
+        self.hnsw_m = 32
+        self.hnsw_ef_construction = 200
+        self.hnsw_ef_search = 64
+        
+        # LRU cache of query embeddings - repeated or refined queries skip the forward pass
+        self._query_cache: OrderedDict = OrderedDict()
+        self.query_cache_size = 1024
+        self._query_cache_lock = threading.Lock()  # retrieval runs on worker threads
+        
+        # Single long-lived connection, shared across threads under the lock
+        self._db_lock = threading.RLock()
+        self._conn = self._connect()
+        
         # Initialize database and vector index
         self._initialize_database()
         self._build_vector_index()
+        self._load_document_metadata()
+        
+    def _enable_half_precision(self):
+        """Run the embedding model in FP16 on GPU, keeping FP32 if pooled outputs overflow"""
         
+        self.embedding_model.half()
+        probe = self.embedding_model.encode(["LAW Matrix precision check"], convert_to_numpy=True)
+        if not np.isfinite(probe).all():
+            self.embedding_model.float()
+            
+    def _connect(self) -> sqlite3.Connection:
+        """Open an autocommit connection with the tuning PRAGMAs applied"""
+        
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA synchronous=NORMAL")  # safe with WAL, no fsync per commit
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+        
+    def close(self):
+        """Persist pending index additions and close the shared database connection"""
+        
+        with self._db_lock:
+            if self._index_dirty:
+                self._save_index()
+            self._conn.close()
+            
     def _initialize_database(self):
         """Initialize SQLite database for document storage"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
+        
+        # WAL mode is persistent in the database file, so readers never block the writer
+        cursor.execute("PRAGMA journal_mode=WAL")
         
         # Create documents table
         cursor.execute('''
@@ -88,118 +160,401 @@ class LawMatrixRAGSystem:
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        # Full-text index over title, content and tags for the lexical prefilter
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS legal_documents_fts
+                USING fts5(id UNINDEXED, title, content, tags)
+            ''')
+            self._fts_enabled = True
+        except sqlite3.OperationalError:  # SQLite built without FTS5
+            self._fts_enabled = False
+            
+        # Index documents stored before the full-text table existed
+        if self._fts_enabled:
+            cursor.execute('''
+                INSERT INTO legal_documents_fts (id, title, content, tags)
+                SELECT id, title, content, tags FROM legal_documents
+                WHERE (SELECT COUNT(*) FROM legal_documents_fts) = 0
+            ''')
         
         print("✅ LAW Matrix v4.0 - RAG Database initialized")
         
     def _build_vector_index(self):
         """Build FAISS vector index for semantic search"""
         
-        self.index = faiss.IndexFlatIP(self.vector_dimension)  # Inner product for cosine similarity
+        # Reuse the persisted index when it still covers exactly the stored documents
+        if self._load_index():
+            print(f"✅ LAW Matrix v4.0 - Vector index loaded with {self.index.ntotal} documents")
+            return
+            
+        self._rebuild_index()
+        self._save_index()
+        print(f"✅ LAW Matrix v4.0 - Vector index built with {self.index.ntotal} documents")
+        
+    def _rebuild_index(self):
+        """Rebuild the in-memory index from the stored embeddings, encoding rows that have none"""
         
-        # Load existing documents and build index
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, content FROM legal_documents")
+        self.index = self._create_index()
+        self._id_by_row = []
         
-        documents = cursor.fetchall()
-        if documents:
-            embeddings = []
-            doc_ids = []
+        # Load existing documents and build index from their stored embeddings
+        cursor = self._conn.cursor()
+        cursor.execute("SELECT id, embedding FROM legal_documents WHERE embedding IS NOT NULL")
+        stored = cursor.fetchall()
+        
+        if stored:
+            doc_ids, blobs = zip(*stored)
+            embeddings_array = self._decode_embeddings(blobs)
+            faiss.normalize_L2(embeddings_array)
+            self.index.add(embeddings_array)
+            self._id_by_row.extend(doc_ids)
             
-            for doc_id, content in documents:
-                embedding = self.embedding_model.encode(content)
-                embeddings.append(embedding)
-                doc_ids.append(doc_id)
-                self.document_store[doc_id] = doc_id
-                
-            embeddings_array = np.array(embeddings).astype('float32')
+        # Only documents without a stored embedding need a forward pass
+        cursor.execute("SELECT id, content FROM legal_documents WHERE embedding IS NULL")
+        missing = cursor.fetchall()
+        
+        if missing:
+            doc_ids, contents = zip(*missing)
+            
+            # Encode them in one batched call rather than one forward pass per document
+            embeddings_array = self._encode(list(contents))
+            cursor.executemany(
+                "UPDATE legal_documents SET embedding = ? WHERE id = ?",
+                [(self._encode_blob(embedding), doc_id) for embedding, doc_id in zip(embeddings_array, doc_ids)]
+            )
             self.index.add(embeddings_array)
+            self._id_by_row.extend(doc_ids)
+            
+        
+    def _load_document_metadata(self):
+        """Cache document metadata in memory so retrieval needs no per-hit queries or JSON parsing"""
+        
+        with self._db_lock:
+            cursor = self._conn.cursor()
+            cursor.execute("SELECT id, title, document_type, jurisdiction, tags, metadata FROM legal_documents")
+            self._meta_by_id = {row[0]: self._document_metadata(*row) for row in cursor}
+            
+    @staticmethod
+    def _document_metadata(doc_id: str, title: str, document_type: str, jurisdiction: str,
+                           tags: Optional[str], metadata: Optional[str]) -> Dict[str, Any]:
+        """Build the cached metadata entry for a document from its stored columns"""
+        
+        return {
+            'id': doc_id,
+            'title': title,
+            'document_type': document_type,
+            'jurisdiction': jurisdiction,
+            'tags': json.loads(tags) if tags else [],
+            'metadata': json.loads(metadata) if metadata else {}
+        }
+        
+    @staticmethod
+    def _encode_blob(embedding: np.ndarray) -> bytes:
+        """Serialize an embedding for the BLOB column as float16 - half the bytes of float32"""
+        
+        return embedding.astype(np.float16).tobytes()
+        
+    def _decode_embeddings(self, blobs: Iterable[bytes]) -> np.ndarray:
+        """Decode stored embedding BLOBs into float32 rows for FAISS"""
+        
+        blobs = list(blobs)
+        half_size = self.vector_dimension * 2
+        
+        if all(len(blob) == half_size for blob in blobs):
+            embeddings = np.frombuffer(b"".join(blobs), dtype=np.float16)
+        else:
+            # Rows written before float16 storage hold float32 vectors
+            embeddings = np.concatenate([
+                np.frombuffer(blob, dtype=np.float16 if len(blob) == half_size else np.float32)
+                for blob in blobs
+            ])
             
-        conn.close()
-        print(f"✅ LAW Matrix v4.0 - Vector index built with {len(documents)} documents")
+        return embeddings.reshape(-1, self.vector_dimension).astype(np.float32)
+        
+    def _load_index(self) -> bool:
+        """Load the persisted vector index if it matches the documents in the database"""
+        
+        ids_path = f"{self.index_path}.ids"
+        if not (os.path.exists(self.index_path) and os.path.exists(ids_path)):
+            return False
+            
+        try:
+            index = faiss.read_index(self.index_path)
+            with open(ids_path, 'r', encoding='utf-8') as f:
+                id_by_row = json.load(f)
+        except (OSError, RuntimeError, ValueError):
+            return False
+            
+        stored_ids = {doc_id for doc_id, in self._conn.execute("SELECT id FROM legal_documents")}
+        
+        # Same length as well as same ids, so an index holding a stale duplicate vector is rebuilt
+        if index.ntotal != len(id_by_row) or len(id_by_row) != len(stored_ids) or set(id_by_row) != stored_ids:
+            return False
+            
+        index.hnsw.efSearch = self.hnsw_ef_search
+        self.index = index
+        self._id_by_row = id_by_row
+        return True
+        
+    def _create_index(self) -> faiss.Index:
+        """Create an empty HNSW index - approximate search in O(log N) instead of a full scan"""
+        
+        index = faiss.IndexHNSWFlat(self.vector_dimension, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = self.hnsw_ef_construction
+        index.hnsw.efSearch = self.hnsw_ef_search
+        return index
+        
+    def _save_index(self):
+        """Persist the vector index and its row -> document id map next to the database"""
+        
+        faiss.write_index(self.index, self.index_path)
+        with open(f"{self.index_path}.ids", 'w', encoding='utf-8') as f:
+            json.dump(self._id_by_row, f)
+        self._index_dirty = False
+            
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts as unit-norm float32 rows, so inner product is cosine similarity"""
+        
+        embeddings = self.embedding_model.encode(
+            texts,
+            batch_size=64,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ).astype('float32')
+        faiss.normalize_L2(embeddings)
+        return embeddings
+        
+    def _encode_query(self, query: str) -> np.ndarray:
+        """Embed a query, reusing the cached vector for a previously seen query"""
+        
+        # MiniLM is uncased, so case and whitespace differences embed identically
+        key = " ".join(query.lower().split())
+        with self._query_cache_lock:
+            query_array = self._query_cache.get(key)
+            if query_array is not None:
+                self._query_cache.move_to_end(key)
+                return query_array
+                
+        # Encode outside the lock so concurrent misses don't serialize on the forward pass
+        query_array = self._encode([key])
+        
+        with self._query_cache_lock:
+            self._query_cache[key] = query_array
+            if len(self._query_cache) > self.query_cache_size:
+                self._query_cache.popitem(last=False)
+                
+        return query_array
         
     def add_document(self, document: LegalDocument):
         """Add a legal document to the knowledge base"""
         
-        # Generate embedding
-        embedding = self.embedding_model.encode(document.content)
+        # Writing the whole index per document would make ingestion O(N) I/O each;
+        # it is persisted on the next bulk add or on close()
+        self._store_documents([document], persist=False)
+        
+        print(f"✅ LAW Matrix v4.0 - Document added: {document.title}")
         
-        # Store in database
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def add_documents(self, documents: Iterable[LegalDocument]):
+        """Add legal documents in bulk - one batched encode, one transaction, one index update"""
         
-        cursor.execute('''
-            INSERT OR REPLACE INTO legal_documents 
-            (id, title, content, document_type, jurisdiction, tags, metadata, embedding)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            document.id,
-            document.title,
-            document.content,
-            document.document_type,
-            document.jurisdiction,
-            json.dumps(document.tags),
-            json.dumps(document.metadata),
-            embedding.tobytes()
-        ))
-        
-        conn.commit()
-        conn.close()
-        
-        # Update vector index
-        embedding_array = np.array([embedding]).astype('float32')
-        self.index.add(embedding_array)
-        self.document_store[document.id] = document.id
+        documents = list(documents)
+        if not documents:
+            return
+            
+        self._store_documents(documents, persist=True)
         
-        print(f"✅ LAW Matrix v4.0 - Document added: {document.title}")
+        print(f"✅ LAW Matrix v4.0 - {len(documents)} documents added")
+        
+    def filter_new_documents(self, documents: Iterable[LegalDocument]) -> List[LegalDocument]:
+        """Return the documents that are not already stored unchanged, so re-seeding skips re-embedding"""
+        
+        documents = list(documents)
+        if not documents:
+            return []
+            
+        with self._db_lock:
+            cursor = self._conn.cursor()
+            cursor.execute('''
+                SELECT id, title, content, document_type, jurisdiction, tags, metadata
+                FROM legal_documents
+                WHERE id IN (SELECT value FROM json_each(?))
+            ''', (json.dumps([document.id for document in documents]),))
+            stored = {row[0]: row[1:] for row in cursor.fetchall()}
+            
+        return [
+            document for document in documents
+            if stored.get(document.id) != (
+                document.title,
+                document.content,
+                document.document_type,
+                document.jurisdiction,
+                json.dumps(document.tags),
+                json.dumps(document.metadata)
+            )
+        ]
+        
+    def _store_documents(self, documents: List[LegalDocument], persist: bool):
+        """Embed, store and index a list of documents, writing the index to disk if persist is set"""
+        
+        # Generate embeddings
+        embeddings_array = self._encode([document.content for document in documents])
+        rows = [
+            (
+                document.id,
+                document.title,
+                document.content,
+                document.document_type,
+                document.jurisdiction,
+                json.dumps(document.tags),
+                json.dumps(document.metadata),
+                self._encode_blob(embedding)
+            )
+            for document, embedding in zip(documents, embeddings_array)
+        ]
         
-    def retrieve_relevant_documents(self, query: str, user_context: UserContext, top_k: int = 5) -> List[Dict]:
+        with self._db_lock:
+            # Store in database
+            cursor = self._conn.cursor()
+            
+            cursor.execute("BEGIN")
+            try:
+                cursor.executemany(self._INSERT_SQL, rows)
+                if self._fts_enabled:
+                    # FTS5 has no primary key, so replace any previous entries explicitly
+                    cursor.execute(
+                        "DELETE FROM legal_documents_fts WHERE id IN (SELECT value FROM json_each(?))",
+                        (json.dumps([document.id for document in documents]),)
+                    )
+                    cursor.executemany(
+                        "INSERT INTO legal_documents_fts (id, title, content, tags) VALUES (?, ?, ?, ?)",
+                        [(row[0], row[1], row[2], row[5]) for row in rows]
+                    )
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+                
+            # Update vector index and metadata cache. HNSW cannot remove vectors, so
+            # replacing an indexed document rebuilds from the stored embeddings
+            # (every stored document is indexed, so the metadata cache tells us which are)
+            doc_ids = [document.id for document in documents]
+            if len(set(doc_ids)) != len(doc_ids) or any(doc_id in self._meta_by_id for doc_id in doc_ids):
+                self._rebuild_index()
+                persist = True  # a stale vector must not survive in the persisted index
+            else:
+                self.index.add(embeddings_array)
+                self._id_by_row.extend(doc_ids)
+            if persist:
+                self._save_index()
+            else:
+                self._index_dirty = True
+            for doc_id, title, _, document_type, jurisdiction, tags, metadata, _ in rows:
+                self._meta_by_id[doc_id] = self._document_metadata(
+                    doc_id, title, document_type, jurisdiction, tags, metadata
+                )
+        
+    def retrieve_relevant_documents(self, query: str, user_context: UserContext, top_k: int = 5,
+                                    include_content: bool = True) -> List[Dict]:
         """
         Retrieve most relevant documents for a query with user context
+        
+        Metadata comes from the in-memory cache; document content is read from
+        the database only when include_content is set.
         """
         
         # Enhance query with user context
         enhanced_query = self._enhance_query_with_context(query, user_context)
         
         # Generate query embedding
-        query_embedding = self.embedding_model.encode(enhanced_query)
-        query_array = np.array([query_embedding]).astype('float32')
+        query_array = self._encode_query(enhanced_query)
         
         # Search vector index
         scores, indices = self.index.search(query_array, top_k)
         
-        # Retrieve document details
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # Map FAISS rows straight to document ids (-1 marks an empty result slot)
+        hits = [
+            (float(score), self._id_by_row[idx])
+            for score, idx in zip(scores[0], indices[0])
+            if 0 <= idx < len(self._id_by_row)
+        ]
         
-        relevant_docs = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx < len(self.document_store):
-                doc_id = list(self.document_store.keys())[idx]
-                cursor.execute("SELECT * FROM legal_documents WHERE id = ?", (doc_id,))
-                doc_data = cursor.fetchone()
-                
-                if doc_data:
-                    relevant_docs.append({
-                        'id': doc_data[0],
-                        'title': doc_data[1],
-                        'content': doc_data[2],
-                        'document_type': doc_data[3],
-                        'jurisdiction': doc_data[4],
-                        'tags': json.loads(doc_data[6]) if doc_data[6] else [],
-                        'metadata': json.loads(doc_data[7]) if doc_data[7] else {},
-                        'relevance_score': float(score)
-                    })
-        
-        conn.close()
+        # Citations and quoted phrases boost the documents that match them lexically;
+        # they compete with the semantic hits rather than replacing them
+        lexical_hits = self._boosted_lexical_hits(query, query_array[0])
+        if lexical_hits:
+            hits = sorted(hits + lexical_hits, key=itemgetter(0), reverse=True)
+        
+        # Hits arrive best first, so keep the first score seen for each document
+        best_scores = {}
+        for score, doc_id in hits:
+            best_scores.setdefault(doc_id, score)
+            
+        # Document details from the metadata cache
+        relevant_docs = [
+            {**self._meta_by_id[doc_id], 'relevance_score': score}
+            for doc_id, score in best_scores.items()
+            if doc_id in self._meta_by_id
+        ]
+        
+        # Content for all hits in a single query
+        if include_content and relevant_docs:
+            placeholders = ", ".join("?" * len(relevant_docs))
+            with self._db_lock:
+                cursor = self._conn.cursor()
+                cursor.execute(
+                    f"SELECT id, content FROM legal_documents WHERE id IN ({placeholders})",
+                    [doc['id'] for doc in relevant_docs]
+                )
+                contents = dict(cursor.fetchall())
+            for doc in relevant_docs:
+                doc['content'] = contents.get(doc['id'], '')
         
         # Filter and rank based on user context
         filtered_docs = self._filter_by_context(relevant_docs, user_context)
         
         return filtered_docs[:top_k]
         
+    def _boosted_lexical_hits(self, query: str, query_vector: np.ndarray,
+                              candidate_limit: int = 200) -> List[Tuple[float, str]]:
+        """
+        Find documents matching the statutes cited or phrases quoted in the query via
+        FTS5, scored by embedding similarity plus _LEXICAL_MATCH_BOOST
+        """
+        
+        if not self._fts_enabled:
+            return []
+            
+        phrases = _CITATION_PATTERN.findall(query) + _QUOTED_PHRASE_PATTERN.findall(query)
+        if not phrases:
+            return []
+            
+        match_expression = " OR ".join('"' + phrase.replace('"', '""') + '"' for phrase in phrases)
+        
+        with self._db_lock:
+            cursor = self._conn.cursor()
+            cursor.execute('''
+                SELECT legal_documents.id, legal_documents.embedding
+                FROM (
+                    SELECT id, bm25(legal_documents_fts) AS rank FROM legal_documents_fts
+                    WHERE legal_documents_fts MATCH ?
+                    ORDER BY rank
+                    LIMIT ?
+                ) AS candidates
+                JOIN legal_documents ON legal_documents.id = candidates.id
+                WHERE legal_documents.embedding IS NOT NULL
+            ''', (match_expression, candidate_limit))
+            candidates = cursor.fetchall()
+            
+        if not candidates:
+            return []
+            
+        doc_ids, blobs = zip(*candidates)
+        embeddings = self._decode_embeddings(blobs)
+        faiss.normalize_L2(embeddings)
+        scores = np.einsum('ij,j->i', embeddings, query_vector) + _LEXICAL_MATCH_BOOST
+        return [(float(score), doc_id) for score, doc_id in zip(scores, doc_ids)]
+        
     def _enhance_query_with_context(self, query: str, user_context: UserContext) -> str:
         """Enhance query with user context information"""
         
@@ -224,58 +579,60 @@ class LawMatrixRAGSystem:
     def _filter_by_context(self, documents: List[Dict], user_context: UserContext) -> List[Dict]:
         """Filter documents based on user context preferences"""
         
-        filtered_docs = []
+        if not documents:
+            return []
+            
+        # Column arrays so each adjustment is one vectorized mask over all candidates
+        scores = np.fromiter((doc['relevance_score'] for doc in documents), dtype=np.float64, count=len(documents))
+        jurisdictions = np.array([doc.get('jurisdiction') or '' for doc in documents], dtype=str)
         
-        for doc in documents:
-            # Priority for current case jurisdiction
-            if user_context.current_case and "Utah" in doc.get('jurisdiction', ''):
-                doc['relevance_score'] *= 1.2
-                
-            # Priority for document types user frequently uses
-            if doc.get('document_type') in user_context.user_preferences.get('preferred_doc_types', []):
-                doc['relevance_score'] *= 1.1
-                
-            # Filter out irrelevant jurisdictions
-            if doc.get('jurisdiction') and doc.get('jurisdiction') not in ['Utah', 'Federal']:
-                doc['relevance_score'] *= 0.8
-                
-            filtered_docs.append(doc)
+        # Priority for current case jurisdiction
+        if user_context.current_case:
+            scores *= np.where(np.char.find(jurisdictions, 'Utah') >= 0, 1.2, 1.0)
+            
+        # Priority for document types user frequently uses
+        preferred_doc_types = user_context._preferred_doc_types
+        if preferred_doc_types:
+            is_preferred = np.fromiter(
+                (doc.get('document_type') in preferred_doc_types for doc in documents),
+                dtype=np.bool_, count=len(documents)
+            )
+            scores *= np.where(is_preferred, 1.1, 1.0)
             
-        # Sort by relevance score
-        return sorted(filtered_docs, key=lambda x: x['relevance_score'], reverse=True)
+        # Filter out irrelevant jurisdictions
+        scores *= np.where(np.isin(jurisdictions, ['Utah', 'Federal', '']), 1.0, 0.8)
+        
+        # Sort by relevance score (stable, so ties keep retrieval order)
+        order = np.argsort(-scores, kind='stable')
+        return [documents[i] | {'relevance_score': float(scores[i])} for i in order]
         
     def update_user_context(self, user_context: UserContext):
         """Update user context in database"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO user_context 
-            (user_id, current_case, active_documents, recent_queries, user_preferences, session_data)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            user_context.user_id,
-            user_context.current_case,
-            json.dumps(user_context.active_documents),
-            json.dumps(user_context.recent_queries),
-            json.dumps(user_context.user_preferences),
-            json.dumps(user_context.session_data)
-        ))
-        
-        conn.commit()
-        conn.close()
+        with self._db_lock:
+            cursor = self._conn.cursor()
+            
+            cursor.execute('''
+                INSERT OR REPLACE INTO user_context 
+                (user_id, current_case, active_documents, recent_queries, user_preferences, session_data)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (
+                user_context.user_id,
+                user_context.current_case,
+                json.dumps(user_context.active_documents),
+                json.dumps(user_context.recent_queries),
+                json.dumps(user_context.user_preferences),
+                json.dumps(user_context.session_data)
+            ))
         
     def get_user_context(self, user_id: str) -> Optional[UserContext]:
         """Retrieve user context from database"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM user_context WHERE user_id = ?", (user_id,))
-        result = cursor.fetchone()
-        
-        conn.close()
+        with self._db_lock:
+            cursor = self._conn.cursor()
+            
+            cursor.execute("SELECT * FROM user_context WHERE user_id = ?", (user_id,))
+            result = cursor.fetchone()
         
         if result:
             return UserContext(
@@ -9,20 +9,210 @@ import json
 import sqlite3
 import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple
-from dataclasses import dataclass, asdict
-import numpy as np
+from typing import Callable, Dict, List, Any, Optional, Tuple
+from dataclasses import dataclass, fields
+from collections import deque
+from types import MappingProxyType
+import orjson
 import logging
+import logging.handlers
+import queue
+import atexit
 from concurrent.futures import ThreadPoolExecutor
-import threading
+import hashlib
+import time
+import re
+
+try:
+    from blake3 import blake3 as _id_hasher
+except ImportError:  # fall back to hashlib (SHA-NI accelerated on modern x86)
+    _id_hasher = hashlib.sha256
+
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick is optional - a compiled regex is used instead
+    ahocorasick = None
 
 # Import our custom modules
-from qlora_config import LawMatrixFineTuner, LawMatrixQLoRAConfig
+from qlora_config import LawMatrixFineTuner, LawMatrixQLoRAConfig, QuantMode
 from rag_system import LawMatrixRAGSystem, UserContext, LegalDocument
 from observability_system import LawMatrixObservabilitySystem, InteractionLog, InteractionType
 from contextual_awareness import LawMatrixContextualAwarenessSystem, ComprehensiveContext, LawMatrixProactiveAssistant
 
-@dataclass
+class _JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, escaping messages correctly"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'timestamp': self.formatTime(record),
+            'level': record.levelname,
+            'component': record.name,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return orjson.dumps(entry).decode()
+
+# Prompt keywords that select a canned response, highest priority first
+_RESPONSE_KEYWORDS = ('custody', 'property')
+_RESPONSE_KEYWORD_PRIORITY = {keyword: priority for priority, keyword in enumerate(_RESPONSE_KEYWORDS)}
+
+def _build_response_keyword_matcher():
+    """Build a single-pass, case-insensitive matcher yielding the priority of every keyword hit"""
+    
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for keyword, priority in _RESPONSE_KEYWORD_PRIORITY.items():
+            automaton.add_word(keyword, priority)
+        automaton.make_automaton()
+        return lambda text: (priority for _, priority in automaton.iter(text.lower()))
+        
+    pattern = re.compile('|'.join(map(re.escape, _RESPONSE_KEYWORDS)), re.IGNORECASE)
+    return lambda text: (_RESPONSE_KEYWORD_PRIORITY[match.group().lower()] for match in pattern.finditer(text))
+
+_match_response_keywords = _build_response_keyword_matcher()
+
+def _select_response_keyword(prompt: str) -> Optional[str]:
+    """Return the highest-priority response keyword found in the prompt, if any"""
+    
+    best = len(_RESPONSE_KEYWORDS)
+    for priority in _match_response_keywords(prompt):
+        if priority < best:
+            best = priority
+            if best == 0:
+                break
+    return _RESPONSE_KEYWORDS[best] if best < len(_RESPONSE_KEYWORDS) else None
+
+# Fixed sections of the contextual prompt
+_PROMPT_HEADER = (
+    "LAW Matrix v4.0 Bulletproof Enterprise Edition - Unified Intelligence Response\n"
+    "You are a specialized legal AI assistant with access to current legal information.\n"
+    "\n"
+    "RELEVANT LEGAL INFORMATION:\n"
+)
+_PROMPT_INSTRUCTIONS = (
+    "INSTRUCTIONS:\n"
+    "Provide a comprehensive legal analysis using the retrieved information above.\n"
+    "Be specific, accurate, and actionable in your response.\n"
+    "Cite relevant legal sources and provide practical guidance."
+)
+
+# Seed documents loaded into the RAG knowledge base on startup
+_INITIAL_LEGAL_DOCUMENTS = (
+    LegalDocument(
+        id="utah_family_law_basics",
+        title="Utah Family Law Fundamentals",
+        content="Utah family law is governed by Title 30 of the Utah Code. Key areas include divorce proceedings under § 30-3-1, child custody under § 30-3-10, and property division under § 30-3-5. The court must consider the best interests of the child in all custody determinations.",
+        document_type="statute",
+        jurisdiction="Utah",
+        date_created=datetime.now(),
+        tags=["family_law", "custody", "divorce", "utah"],
+        metadata={"title": "30", "section": "3-10"}
+    ),
+    LegalDocument(
+        id="custody_factors_utah",
+        title="Utah Child Custody Factors",
+        content="Utah Code § 30-3-10 establishes factors for determining child custody: (1) past conduct and demonstrated moral standards of each parent, (2) which parent is most likely to act in the best interests of the child, (3) which parent has been the primary caregiver, (4) the child's relationship with each parent, and (5) the child's preference if the child is of sufficient age and capacity.",
+        document_type="statute",
+        jurisdiction="Utah",
+        date_created=datetime.now(),
+        tags=["custody", "best_interests", "factors", "utah"],
+        metadata={"title": "30", "section": "3-10"}
+    ),
+    LegalDocument(
+        id="property_division_utah",
+        title="Utah Marital Property Division",
+        content="Utah follows equitable distribution principles for marital property division. The court considers factors including: (1) the contribution of each spouse to the acquisition of marital property, (2) the market and emotional value of the marital property, (3) the duration of the marriage, (4) the ages and health of the spouses, and (5) the earning capacity of each spouse.",
+        document_type="statute",
+        jurisdiction="Utah",
+        date_created=datetime.now(),
+        tags=["property_division", "marital_property", "equitable_distribution"],
+        metadata={"title": "30", "section": "3-5"}
+    )
+)
+
+# Minimum interval between automatic retraining runs
+_RETRAINING_INTERVAL_NS = 7 * 24 * 3600 * 10**9
+
+# Canned responses returned until the fine-tuned model is wired in
+_CUSTODY_RESPONSE = """Based on Utah Code § 30-3-10, child custody determinations must consider the best interests of the child. Key factors include:
+
+1. **Past Conduct and Moral Standards**: The court evaluates each parent's demonstrated moral standards and past conduct.
+
+2. **Primary Caregiver**: Consideration of which parent has been the primary caregiver and the child's relationship with each parent.
+
+3. **Child's Best Interests**: All decisions must prioritize the child's physical, emotional, and developmental well-being.
+
+4. **Child's Preference**: If the child is of sufficient age and capacity, their preference may be considered.
+
+5. **Parental Fitness**: Each parent's ability to provide for the child's needs and maintain stability.
+
+**Practical Recommendations:**
+- Document your involvement in the child's daily care
+- Maintain consistent, positive communication with the child
+- Demonstrate stability in living arrangements and employment
+- Consider the child's educational and social needs
+
+**Next Steps:**
+1. Gather documentation of your involvement as primary caregiver
+2. Prepare evidence of stable living arrangements
+3. Consider child's educational and social connections
+4. Consult with family law attorney for case-specific strategy"""
+
+_PROPERTY_RESPONSE = """Utah follows equitable distribution principles for marital property division under § 30-3-5. The court considers multiple factors:
+
+1. **Contribution to Acquisition**: Each spouse's contribution to acquiring marital property, both financial and non-financial.
+
+2. **Market and Emotional Value**: The current market value and emotional significance of marital assets.
+
+3. **Duration of Marriage**: Longer marriages typically result in more equal distribution.
+
+4. **Spouse Ages and Health**: Physical and mental health considerations affecting earning capacity.
+
+5. **Earning Capacity**: Current and future earning potential of each spouse.
+
+**Key Considerations:**
+- Separate property (acquired before marriage or by inheritance) typically remains with the original owner
+- Marital property includes assets acquired during marriage
+- Debts are also subject to equitable distribution
+- Business interests require careful valuation
+
+**Strategic Recommendations:**
+1. Conduct thorough asset inventory and valuation
+2. Document separate property with clear evidence
+3. Consider tax implications of property division
+4. Negotiate settlement when possible to maintain control"""
+
+_DEFAULT_RESPONSE = """Based on the legal information provided, I can offer the following analysis:
+
+**Legal Framework**: The applicable law establishes clear guidelines for this matter, with specific factors that courts must consider in their determinations.
+
+**Key Considerations**:
+1. Statutory requirements must be met
+2. Case law precedents provide guidance
+3. Factual circumstances are crucial
+4. Documentation is essential
+
+**Recommendations**:
+1. Gather all relevant documentation
+2. Consult applicable legal authorities
+3. Consider case-specific factors
+4. Develop a strategic approach
+
+**Next Steps**:
+- Review all applicable legal requirements
+- Organize supporting documentation
+- Consider professional legal consultation
+- Develop a comprehensive strategy
+
+This analysis is based on current legal authority and should be supplemented with case-specific legal advice."""
+
+_KEYWORD_RESPONSES = {
+    'custody': _CUSTODY_RESPONSE,
+    'property': _PROPERTY_RESPONSE
+}
+
+@dataclass(slots=True)
 class IntelligenceSystemConfig:
     """Configuration for the unified intelligence system"""
     enable_qlora: bool = True
@@ -33,6 +223,77 @@ class IntelligenceSystemConfig:
     feedback_threshold: int = 100  # Minimum interactions before retraining
     context_window_size: int = 10
     quality_threshold: float = 0.8
+    qlora_quant_mode: Optional[QuantMode] = "nf4"  # NF4 + double quantization for serving; None picks from free GPU memory
+
+_CONFIG_FIELDS = tuple(config_field.name for config_field in fields(IntelligenceSystemConfig))
+
+class _BatchingRunner:
+    """
+    Micro-batches concurrent generation requests into one model call
+    Requests arriving within max_wait of each other share a padded batch
+    """
+    
+    def __init__(self, generate_fn: Callable[[List[str]], List[str]], max_batch_size: int = 8, max_wait: float = 0.005):
+        self.generate_fn = generate_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait  # seconds
+        self._queue = asyncio.Queue()
+        self._task = None
+        
+    def start(self):
+        """Start the background batching task on the running loop"""
+        
+        self._task = asyncio.create_task(self._run())
+        
+    async def stop(self):
+        """Stop batching and cancel requests that were never scheduled"""
+        
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+            
+    async def submit(self, prompt: str) -> str:
+        """Queue a prompt and wait for its generated response"""
+        
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((prompt, future))
+        return await future
+        
+    async def _run(self):
+        """Collect up to max_batch_size prompts per window and run them in one worker-thread call"""
+        
+        while True:
+            batch = [await self._queue.get()]
+            
+            # Give concurrent requests a short window to join unless the batch is already full
+            if self._queue.qsize() < self.max_batch_size - 1:
+                await asyncio.sleep(self.max_wait)
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                
+            try:
+                responses = await asyncio.to_thread(self.generate_fn, [prompt for prompt, _ in batch])
+            except asyncio.CancelledError:
+                for _, future in batch:
+                    future.cancel()
+                raise
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+                
+            for (_, future), response in zip(batch, responses):
+                if not future.done():
+                    future.set_result(response)
 
 class LawMatrixUnifiedIntelligenceSystem:
     """
@@ -54,17 +315,31 @@ class LawMatrixUnifiedIntelligenceSystem:
         # System state
         self.is_initialized = False
         self.active_sessions = {}
-        self.feedback_queue = []
-        self.retraining_lock = threading.Lock()
+        # Recent feedback only - the oldest entries are discarded once the bound is hit
+        # (all feedback is still persisted by the observability system)
+        self.feedback_queue = deque(maxlen=self.config.feedback_threshold * 10)
+        self.retraining_lock = asyncio.Lock()
+        
+        # Interaction logs are queued on the request path and written in batches
+        # by a background task; logs are dropped rather than blocking when full
+        self.log_queue_size = 10000
+        self.log_batch_size = 256
+        self._log_queue = None
+        self._log_task = None
+        self._proactive_lock = asyncio.Lock()
+        
+        # Concurrent generation requests share batched model calls once a fine-tuned model is loaded
+        self._batcher = None
         
         # Performance metrics
         self.system_metrics = {
             'total_interactions': 0,
-            'average_response_quality': 0.0,
             'user_satisfaction': 0.0,
             'system_uptime': datetime.now(),
             'last_retraining': None
         }
+        self._last_retraining_ns = None  # monotonic clock reading of last_retraining
+        self._quality_sum = 0.0  # average_response_quality is derived on read
         
     def _setup_logging(self) -> logging.Logger:
         """Setup comprehensive logging for the unified system"""
@@ -72,6 +347,10 @@ class LawMatrixUnifiedIntelligenceSystem:
         logger = logging.getLogger('LawMatrixUnifiedIntelligence')
         logger.setLevel(logging.INFO)
         
+        # The logger is shared, so only the first instance wires up handlers
+        if logger.handlers:
+            return logger
+            
         # Create logs directory
         os.makedirs('logs', exist_ok=True)
         
@@ -80,12 +359,15 @@ class LawMatrixUnifiedIntelligenceSystem:
         file_handler.setLevel(logging.INFO)
         
         # JSON formatter for structured logging
-        formatter = logging.Formatter(
-            '{"timestamp": "%(asctime)s", "level": "%(levelname)s", "component": "%(name)s", "message": "%(message)s"}'
-        )
-        file_handler.setFormatter(formatter)
+        file_handler.setFormatter(_JsonFormatter())
         
-        logger.addHandler(file_handler)
+        # Records are queued and written by a listener thread, so request
+        # handling on the event loop never blocks on disk writes
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
         
         return logger
         
@@ -95,6 +377,13 @@ class LawMatrixUnifiedIntelligenceSystem:
         self.logger.info("🚀 LAW Matrix v4.0 - Initializing Unified Intelligence System")
         
         try:
+            # Blocking work (SQLite writes, retrieval) runs on the loop's default
+            # executor; size it via LAW_THREAD_POOL_SIZE (default 32 threads)
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(
+                max_workers=int(os.getenv('LAW_THREAD_POOL_SIZE', '32')),
+                thread_name_prefix='law-io'
+            ))
+            
             # Initialize subsystems in parallel
             tasks = []
             
@@ -117,6 +406,14 @@ class LawMatrixUnifiedIntelligenceSystem:
             if self.contextual_awareness_system:
                 self.proactive_assistant = LawMatrixProactiveAssistant(self.contextual_awareness_system)
                 
+            if self.qlora_system and self.qlora_system.peft_model is not None:
+                self._batcher = _BatchingRunner(self.qlora_system.generate)
+                self._batcher.start()
+                
+            if self.observability_system:
+                self._log_queue = asyncio.Queue(maxsize=self.log_queue_size)
+                self._log_task = asyncio.create_task(self._log_flusher())
+                
             self.is_initialized = True
             self.logger.info("✅ LAW Matrix v4.0 - Unified Intelligence System initialized successfully")
             
@@ -153,7 +450,7 @@ class LawMatrixUnifiedIntelligenceSystem:
         """Initialize QLoRA fine-tuning system"""
         
         self.logger.info("Initializing QLoRA system...")
-        self.qlora_system = LawMatrixFineTuner()
+        self.qlora_system = LawMatrixFineTuner(quant_mode=self.config.qlora_quant_mode)
         
         # Check if fine-tuned model exists
         if os.path.exists("./lawmatrix-lora-adapters"):
@@ -167,55 +464,29 @@ class LawMatrixUnifiedIntelligenceSystem:
     async def _load_initial_legal_documents(self):
         """Load initial legal documents into RAG system"""
         
-        initial_documents = [
-            LegalDocument(
-                id="utah_family_law_basics",
-                title="Utah Family Law Fundamentals",
-                content="Utah family law is governed by Title 30 of the Utah Code. Key areas include divorce proceedings under § 30-3-1, child custody under § 30-3-10, and property division under § 30-3-5. The court must consider the best interests of the child in all custody determinations.",
-                document_type="statute",
-                jurisdiction="Utah",
-                date_created=datetime.now(),
-                tags=["family_law", "custody", "divorce", "utah"],
-                metadata={"title": "30", "section": "3-10"}
-            ),
-            LegalDocument(
-                id="custody_factors_utah",
-                title="Utah Child Custody Factors",
-                content="Utah Code § 30-3-10 establishes factors for determining child custody: (1) past conduct and demonstrated moral standards of each parent, (2) which parent is most likely to act in the best interests of the child, (3) which parent has been the primary caregiver, (4) the child's relationship with each parent, and (5) the child's preference if the child is of sufficient age and capacity.",
-                document_type="statute",
-                jurisdiction="Utah",
-                date_created=datetime.now(),
-                tags=["custody", "best_interests", "factors", "utah"],
-                metadata={"title": "30", "section": "3-10"}
-            ),
-            LegalDocument(
-                id="property_division_utah",
-                title="Utah Marital Property Division",
-                content="Utah follows equitable distribution principles for marital property division. The court considers factors including: (1) the contribution of each spouse to the acquisition of marital property, (2) the market and emotional value of the marital property, (3) the duration of the marriage, (4) the ages and health of the spouses, and (5) the earning capacity of each spouse.",
-                document_type="statute",
-                jurisdiction="Utah",
-                date_created=datetime.now(),
-                tags=["property_division", "marital_property", "equitable_distribution"],
-                metadata={"title": "30", "section": "3-5"}
-            )
-        ]
-        
-        for doc in initial_documents:
-            self.rag_system.add_document(doc)
+        # Documents already stored unchanged keep their persisted embeddings
+        new_documents = self.rag_system.filter_new_documents(_INITIAL_LEGAL_DOCUMENTS)
+        if new_documents:
+            self.rag_system.add_documents(new_documents)
             
-        self.logger.info(f"Loaded {len(initial_documents)} initial legal documents")
+        self.logger.info(f"Loaded {len(_INITIAL_LEGAL_DOCUMENTS)} initial legal documents ({len(new_documents)} new)")
         
     async def process_user_query(self, user_id: str, session_id: str, query: str, context_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Process user query through the unified intelligence system
         This is the main entry point for all AI interactions
+        
+        Interaction logs hold a read-only view of context_data rather than a copy,
+        so callers must not mutate it after the call.
         """
         
         if not self.is_initialized:
             raise RuntimeError("Unified intelligence system not initialized")
             
         start_time = datetime.now()
+        start_ns = time.perf_counter_ns()
         interaction_id = self._generate_interaction_id(user_id, session_id, query)
+        context_view = MappingProxyType(context_data)
         
         self.logger.info(f"Processing query for user {user_id}, session {session_id}")
         
@@ -225,40 +496,24 @@ class LawMatrixUnifiedIntelligenceSystem:
                 user_id, session_id, query, context_data
             )
             
-            # Step 2: Retrieve relevant information using RAG
-            relevant_documents = []
-            if self.rag_system:
-                user_context = UserContext(
-                    user_id=user_id,
-                    current_case=context_data.get('current_case', ''),
-                    active_documents=context_data.get('active_documents', []),
-                    recent_queries=context_data.get('recent_queries', []),
-                    user_preferences=context_data.get('user_preferences', {}),
-                    session_data=context_data.get('session_data', {})
-                )
-                
-                relevant_documents = self.rag_system.retrieve_relevant_documents(query, user_context)
+            # Step 2: Retrieve relevant information using RAG and generate proactive
+            # assistance - the two are independent, so they run concurrently
+            relevant_documents, proactive_suggestions = await asyncio.gather(
+                self._retrieve_relevant_documents(user_id, query, context_data),
+                self._generate_proactive_suggestions(user_id, session_id, context_data)
+            )
                 
             # Step 3: Generate contextual response using fine-tuned model
             contextual_prompt = self._build_contextual_prompt(query, relevant_documents, comprehensive_context)
             
-            # For now, we'll simulate the fine-tuned model response
-            # In production, this would call the actual QLoRA model
+            # Falls back to a simulated response until a fine-tuned model is loaded
             response = await self._generate_response_with_qlora(contextual_prompt)
             
             # Step 4: Calculate quality metrics
             quality_scores = self._calculate_quality_scores(query, response, relevant_documents)
             
-            # Step 5: Generate proactive assistance
-            proactive_suggestions = []
-            if self.proactive_assistant:
-                assistance_result = self.proactive_assistant.process_user_interaction(
-                    user_id, session_id, context_data
-                )
-                proactive_suggestions = assistance_result.get('assistance_suggestions', [])
-                
-            # Step 6: Log interaction for observability
-            processing_time = (datetime.now() - start_time).total_seconds() * 1000
+            # Step 5: Log interaction for observability
+            processing_time = (time.perf_counter_ns() - start_ns) / 1e6
             
             interaction_log = InteractionLog(
                 id=interaction_id,
@@ -266,22 +521,21 @@ class LawMatrixUnifiedIntelligenceSystem:
                 session_id=session_id,
                 timestamp=start_time,
                 interaction_type=InteractionType.QUERY,
-                input_data={'query': query, 'context': context_data},
+                input_data={'query': query, 'context': context_view},
                 output_data={'response': response, 'documents': relevant_documents},
                 processing_time_ms=processing_time,
                 tokens_used=self._estimate_tokens(query + response),
                 model_version="lawmatrix-v4.0-unified",
-                context_data=context_data,
+                context_data=context_view,
                 quality_scores=quality_scores
             )
             
-            if self.observability_system:
-                self.observability_system.log_interaction(interaction_log)
+            self._queue_interaction_log(interaction_log)
                 
-            # Step 7: Update system metrics
+            # Step 6: Update system metrics
             self._update_system_metrics(quality_scores, processing_time)
             
-            # Step 8: Check for retraining trigger
+            # Step 7: Check for retraining trigger
             if self.config.auto_fine_tuning:
                 await self._check_retraining_trigger()
                 
@@ -303,23 +557,23 @@ class LawMatrixUnifiedIntelligenceSystem:
             self.logger.error(f"Error processing query: {str(e)}")
             
             # Log error interaction
-            if self.observability_system:
+            if self._log_queue:
                 error_log = InteractionLog(
                     id=interaction_id,
                     user_id=user_id,
                     session_id=session_id,
                     timestamp=start_time,
                     interaction_type=InteractionType.ERROR,
-                    input_data={'query': query, 'context': context_data},
+                    input_data={'query': query, 'context': context_view},
                     output_data={},
-                    processing_time_ms=(datetime.now() - start_time).total_seconds() * 1000,
+                    processing_time_ms=(time.perf_counter_ns() - start_ns) / 1e6,
                     tokens_used=0,
                     model_version="lawmatrix-v4.0-unified",
-                    context_data=context_data,
+                    context_data=context_view,
                     quality_scores={},
                     error_details=str(e)
                 )
-                self.observability_system.log_interaction(error_log)
+                self._queue_interaction_log(error_log)
                 
             return {
                 'interaction_id': interaction_id,
@@ -327,6 +581,93 @@ class LawMatrixUnifiedIntelligenceSystem:
                 'system_status': 'error'
             }
             
+    async def _retrieve_relevant_documents(self, user_id: str, query: str, context_data: Dict[str, Any]) -> List[Dict]:
+        """Retrieve documents relevant to the query on a worker thread"""
+        
+        if not self.rag_system:
+            return []
+            
+        user_context = UserContext(
+            user_id=user_id,
+            current_case=context_data.get('current_case', ''),
+            active_documents=context_data.get('active_documents', []),
+            recent_queries=context_data.get('recent_queries', []),
+            user_preferences=context_data.get('user_preferences', {}),
+            session_data=context_data.get('session_data', {})
+        )
+        
+        return await asyncio.to_thread(self.rag_system.retrieve_relevant_documents, query, user_context)
+        
+    async def _generate_proactive_suggestions(self, user_id: str, session_id: str, context_data: Dict[str, Any]) -> List[Dict]:
+        """Run the proactive assistant on a worker thread"""
+        
+        if not self.proactive_assistant:
+            return []
+            
+        # The context store's connection is shared without a lock, so calls are serialized
+        async with self._proactive_lock:
+            assistance_result = await asyncio.to_thread(
+                self.proactive_assistant.process_user_interaction, user_id, session_id, context_data
+            )
+        return assistance_result.get('assistance_suggestions', [])
+        
+    def _queue_interaction_log(self, interaction_log: InteractionLog):
+        """Hand an interaction log to the background flusher without blocking"""
+        
+        if not self._log_queue:
+            return
+            
+        try:
+            self._log_queue.put_nowait(interaction_log)
+        except asyncio.QueueFull:
+            self.logger.warning(f"Interaction log queue full - dropping log {interaction_log.id}")
+            
+    async def _log_flusher(self):
+        """Drain queued interaction logs and write each batch in one transaction"""
+        
+        stopping = False
+        while not stopping:
+            logs = [await self._log_queue.get()]
+            while len(logs) < self.log_batch_size and not self._log_queue.empty():
+                logs.append(self._log_queue.get_nowait())
+                
+            # None is the shutdown sentinel; the rest of the batch is still written
+            if None in logs:
+                stopping = True
+                logs = [log for log in logs if log is not None]
+                if not logs:
+                    break
+                    
+            try:
+                await asyncio.to_thread(self.observability_system.log_interactions, logs)
+            except Exception as e:
+                self.logger.error(f"Failed to write {len(logs)} interaction logs: {str(e)}")
+                
+    async def shutdown(self):
+        """Stop the background tasks and write any logs still queued"""
+        
+        if self._batcher:
+            await self._batcher.stop()
+            self._batcher = None
+            
+        # Queue the sentinel behind any pending logs and wait for the flusher to write them;
+        # a flusher that has already exited would never drain it, so skip the put then
+        if self._log_task:
+            if not self._log_task.done():
+                await self._log_queue.put(None)
+                await self._log_task
+            self._log_task = None
+            self._log_queue = None
+            
+        # The context store buffers writes; close it once no proactive call is in flight
+        if self.contextual_awareness_system:
+            async with self._proactive_lock:
+                self.contextual_awareness_system.close()
+                
+        # All interaction logs are written by now; closing also checkpoints and optimizes the database
+        if self.observability_system:
+            await asyncio.to_thread(self.observability_system.close)
+                
     async def _capture_comprehensive_context(self, user_id: str, session_id: str, query: str, context_data: Dict[str, Any]) -> Optional[ComprehensiveContext]:
         """Capture comprehensive user context"""
         
@@ -340,113 +681,25 @@ class LawMatrixUnifiedIntelligenceSystem:
     def _build_contextual_prompt(self, query: str, relevant_documents: List[Dict], context: Optional[ComprehensiveContext]) -> str:
         """Build contextual prompt for the fine-tuned model"""
         
-        prompt_parts = [
-            "LAW Matrix v4.0 Bulletproof Enterprise Edition - Unified Intelligence Response",
-            "You are a specialized legal AI assistant with access to current legal information.",
-            "",
-            "RELEVANT LEGAL INFORMATION:"
-        ]
-        
-        for i, doc in enumerate(relevant_documents[:3], 1):
-            prompt_parts.extend([
-                f"{i}. {doc['title']} ({doc['document_type']})",
-                f"   Jurisdiction: {doc['jurisdiction']}",
-                f"   Content: {doc['content'][:500]}...",
-                ""
-            ])
-            
-        prompt_parts.extend([
-            "USER QUERY:",
-            query,
-            "",
-            "INSTRUCTIONS:",
-            "Provide a comprehensive legal analysis using the retrieved information above.",
-            "Be specific, accurate, and actionable in your response.",
-            "Cite relevant legal sources and provide practical guidance."
-        ])
-        
-        return "\n".join(prompt_parts)
+        documents_block = "".join(
+            f"{i}. {doc['title']} ({doc['document_type']})\n"
+            f"   Jurisdiction: {doc['jurisdiction']}\n"
+            f"   Content: {doc['content'][:500]}...\n\n"
+            for i, doc in enumerate(relevant_documents[:3], 1)
+        )
+        
+        return f"{_PROMPT_HEADER}{documents_block}USER QUERY:\n{query}\n\n{_PROMPT_INSTRUCTIONS}"
         
     async def _generate_response_with_qlora(self, contextual_prompt: str) -> str:
         """Generate response using fine-tuned QLoRA model"""
         
-        # In production, this would call the actual fine-tuned model
-        # For now, we'll simulate a high-quality response
-        
-        if "custody" in contextual_prompt.lower():
-            return """Based on Utah Code § 30-3-10, child custody determinations must consider the best interests of the child. Key factors include:
-
-1. **Past Conduct and Moral Standards**: The court evaluates each parent's demonstrated moral standards and past conduct.
-
-2. **Primary Caregiver**: Consideration of which parent has been the primary caregiver and the child's relationship with each parent.
-
-3. **Child's Best Interests**: All decisions must prioritize the child's physical, emotional, and developmental well-being.
-
-4. **Child's Preference**: If the child is of sufficient age and capacity, their preference may be considered.
-
-5. **Parental Fitness**: Each parent's ability to provide for the child's needs and maintain stability.
-
-**Practical Recommendations:**
-- Document your involvement in the child's daily care
-- Maintain consistent, positive communication with the child
-- Demonstrate stability in living arrangements and employment
-- Consider the child's educational and social needs
-
-**Next Steps:**
-1. Gather documentation of your involvement as primary caregiver
-2. Prepare evidence of stable living arrangements
-3. Consider child's educational and social connections
-4. Consult with family law attorney for case-specific strategy"""
+        # The model runs on a worker thread, batched with other in-flight requests
+        if self._batcher:
+            return await self._batcher.submit(contextual_prompt)
             
-        elif "property" in contextual_prompt.lower():
-            return """Utah follows equitable distribution principles for marital property division under § 30-3-5. The court considers multiple factors:
-
-1. **Contribution to Acquisition**: Each spouse's contribution to acquiring marital property, both financial and non-financial.
-
-2. **Market and Emotional Value**: The current market value and emotional significance of marital assets.
-
-3. **Duration of Marriage**: Longer marriages typically result in more equal distribution.
-
-4. **Spouse Ages and Health**: Physical and mental health considerations affecting earning capacity.
-
-5. **Earning Capacity**: Current and future earning potential of each spouse.
-
-**Key Considerations:**
-- Separate property (acquired before marriage or by inheritance) typically remains with the original owner
-- Marital property includes assets acquired during marriage
-- Debts are also subject to equitable distribution
-- Business interests require careful valuation
-
-**Strategic Recommendations:**
-1. Conduct thorough asset inventory and valuation
-2. Document separate property with clear evidence
-3. Consider tax implications of property division
-4. Negotiate settlement when possible to maintain control"""
-            
-        else:
-            return """Based on the legal information provided, I can offer the following analysis:
-
-**Legal Framework**: The applicable law establishes clear guidelines for this matter, with specific factors that courts must consider in their determinations.
-
-**Key Considerations**:
-1. Statutory requirements must be met
-2. Case law precedents provide guidance
-3. Factual circumstances are crucial
-4. Documentation is essential
-
-**Recommendations**:
-1. Gather all relevant documentation
-2. Consult applicable legal authorities
-3. Consider case-specific factors
-4. Develop a strategic approach
-
-**Next Steps**:
-- Review all applicable legal requirements
-- Organize supporting documentation
-- Consider professional legal consultation
-- Develop a comprehensive strategy
-
-This analysis is based on current legal authority and should be supplemented with case-specific legal advice."""
+        # No fine-tuned model loaded yet - simulate a high-quality response
+        keyword = _select_response_keyword(contextual_prompt)
+        return _KEYWORD_RESPONSES.get(keyword, _DEFAULT_RESPONSE)
             
     def _calculate_quality_scores(self, query: str, response: str, relevant_documents: List[Dict]) -> Dict[str, float]:
         """Calculate quality scores for the interaction"""
@@ -455,15 +708,16 @@ This analysis is based on current legal authority and should be supplemented wit
         
         # Relevance score based on document relevance
         if relevant_documents:
-            avg_relevance = np.mean([doc.get('relevance_score', 0.5) for doc in relevant_documents])
+            avg_relevance = sum(doc.get('relevance_score', 0.5) for doc in relevant_documents) / len(relevant_documents)
             scores['relevance'] = min(avg_relevance * 1.2, 1.0)
         else:
             scores['relevance'] = 0.6
             
         # Completeness score based on response length and detail
-        if len(response) > 500:
+        response_length = len(response)
+        if response_length > 500:
             scores['completeness'] = 0.9
-        elif len(response) > 200:
+        elif response_length > 200:
             scores['completeness'] = 0.7
         else:
             scores['completeness'] = 0.5
@@ -472,9 +726,10 @@ This analysis is based on current legal authority and should be supplemented wit
         scores['accuracy'] = 0.85
         
         # Clarity score based on structure and readability
-        if "**" in response and len(response.split('\n')) > 10:
+        line_count = response.count('\n') + 1
+        if "**" in response and line_count > 10:
             scores['clarity'] = 0.9
-        elif len(response.split('\n')) > 5:
+        elif line_count > 5:
             scores['clarity'] = 0.7
         else:
             scores['clarity'] = 0.6
@@ -484,9 +739,9 @@ This analysis is based on current legal authority and should be supplemented wit
     def _generate_interaction_id(self, user_id: str, session_id: str, query: str) -> str:
         """Generate unique interaction ID"""
         
-        import hashlib
-        content = f"{user_id}_{session_id}_{datetime.now().isoformat()}_{query[:50]}"
-        return hashlib.md5(content.encode()).hexdigest()
+        hasher = _id_hasher(f"{user_id}\0{session_id}\0{query}".encode())
+        hasher.update(time.time_ns().to_bytes(8, 'little'))
+        return hasher.hexdigest()[:32]
         
     def _estimate_tokens(self, text: str) -> int:
         """Estimate token count for text"""
@@ -498,30 +753,35 @@ This analysis is based on current legal authority and should be supplemented wit
         """Update system performance metrics"""
         
         self.system_metrics['total_interactions'] += 1
+        self._quality_sum += sum(quality_scores.values()) / len(quality_scores)
         
-        # Update average response quality
-        avg_quality = np.mean(list(quality_scores.values()))
-        current_avg = self.system_metrics['average_response_quality']
-        total = self.system_metrics['total_interactions']
-        
-        self.system_metrics['average_response_quality'] = (
-            (current_avg * (total - 1) + avg_quality) / total
-        )
+    @property
+    def average_response_quality(self) -> float:
+        """Mean response quality over all processed interactions"""
         
-        # Log performance metrics
-        self.logger.info(f"System metrics updated - Total interactions: {total}, Avg quality: {avg_quality:.3f}")
+        return self._quality_sum / max(1, self.system_metrics['total_interactions'])
         
     async def _check_retraining_trigger(self):
         """Check if system should trigger retraining"""
         
-        with self.retraining_lock:
-            if self.system_metrics['total_interactions'] >= self.config.feedback_threshold:
-                if not self.system_metrics['last_retraining'] or \
-                   (datetime.now() - self.system_metrics['last_retraining']).days >= 7:
-                    
-                    self.logger.info("Triggering automatic retraining...")
-                    await self._trigger_retraining()
+        # Lock-free fast path: skip until the threshold is reached and the interval has elapsed,
+        # and while another check is already running; a skipped retrain is re-checked next call
+        if self.system_metrics['total_interactions'] < self.config.feedback_threshold or \
+           not self._retraining_interval_elapsed() or self.retraining_lock.locked():
+            return
+            
+        async with self.retraining_lock:
+            if self._retraining_interval_elapsed():
+                
+                self.logger.info("Triggering automatic retraining...")
+                await self._trigger_retraining()
                     
+    def _retraining_interval_elapsed(self) -> bool:
+        """Whether the minimum interval since the last retraining has passed"""
+        
+        return self._last_retraining_ns is None or \
+            time.monotonic_ns() - self._last_retraining_ns >= _RETRAINING_INTERVAL_NS
+            
     async def _trigger_retraining(self):
         """Trigger automatic retraining of the fine-tuned model"""
         
@@ -536,6 +796,7 @@ This analysis is based on current legal authority and should be supplemented wit
                     # In production, this would trigger actual retraining
                     # For now, we'll just log the event
                     self.system_metrics['last_retraining'] = datetime.now()
+                    self._last_retraining_ns = time.monotonic_ns()
                     self.logger.info("Retraining completed successfully")
                 else:
                     self.logger.info("Insufficient training data for retraining")
@@ -569,8 +830,8 @@ This analysis is based on current legal authority and should be supplemented wit
                 'observability': self.observability_system is not None,
                 'contextual_awareness': self.contextual_awareness_system is not None
             },
-            'metrics': self.system_metrics,
-            'configuration': asdict(self.config),
+            'metrics': {**self.system_metrics, 'average_response_quality': self.average_response_quality},
+            'configuration': {name: getattr(self.config, name) for name in _CONFIG_FIELDS},  # fields are flat, no asdict deep copy
             'uptime_hours': (datetime.now() - self.system_metrics['system_uptime']).total_seconds() / 3600
         }
 
@@ -614,5 +875,7 @@ if __name__ == "__main__":
         print(f"Quality scores: {result['quality_scores']}")
         print(f"Relevant documents found: {len(result['relevant_documents'])}")
         
+        await unified_system.shutdown()
+        
     # Run the example
     asyncio.run(main())